@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+
+from collections import deque
+
+import content_filters
+
+# --- Size-Aware Admission Control ---
+#
+# Every compression job is priced before it starts: one CPU slot (the codecs
+# are single-threaded Python) plus an estimated peak memory derived from the
+# input size and the codec. Jobs are admitted while both budgets have room,
+# wait in a bounded FIFO queue otherwise, and are rejected (HTTP 429 with a
+# Retry-After hint) once the queue is full or the wait times out.
+
+MB = 1024 * 1024
+
+# job kind -> (fixed bytes, bytes per input byte, input bytes per CPU second)
+# Rough figures measured on the bundled samples; the fixed part is dominated
+# by the 64K-entry LZW dictionary. LZMA kinds add LZMA_DICT_FACTOR times the
+# dictionary content_filters sizes to the input (peak RSS measured at
+# 1.0MB / 12.6MB / 98MB / 390MB for 10KB / 1MB / 8MB / 32MB inputs).
+LZMA_DICT_FACTOR = 11 # bt4 match finder + window, per dictionary byte
+LZMA_KINDS = ('lzma', 'auto')
+
+COST_PROFILES = {
+    'lzma':       (2 * MB, 2, 1.0 * MB),
+    'hybrid':     (16 * MB, 16, 0.5 * MB),
+    'lzw':        (16 * MB, 10, 1.0 * MB),
+    'auto':       (16 * MB, 20, 0.4 * MB),
+    'dedup':      (100 * MB, 2, 1.5 * MB),
+    'delta':      (100 * MB, 6, 8.0 * MB),
+    'huffman':    (8 * MB, 0, 3.0 * MB),
+    'decompress': (70 * MB, 12, 5.0 * MB),
+    'simulate':   (16 * MB, 30, 0.5 * MB),
+}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_cost(size, kind):
+    """Returns (estimated peak memory in bytes, estimated CPU seconds) for one job."""
+    if kind not in COST_PROFILES:
+        kind = 'auto'
+    fixed, per_byte, throughput = COST_PROFILES[kind]
+    memory = fixed + per_byte * size
+    if kind in LZMA_KINDS:
+        memory += LZMA_DICT_FACTOR * content_filters.dict_size_for(size)
+    return memory, size / throughput
+
+
+class Ticket:
+    """An admitted job; release() (or leaving the with-block) returns its budget."""
+
+    def __init__(self, controller, memory, seconds):
+        self._controller = controller
+        self.memory = memory
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, cpu_slots=None, memory_budget=None, max_queue=16, queue_timeout=10.0):
+        self.cpu_slots = cpu_slots or os.cpu_count() or 1
+        self.memory_budget = memory_budget
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._running = []
+        self._memory_in_use = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    def _fits(self, memory):
+        if not self._running:
+            # An idle node always takes the job, otherwise oversized inputs
+            # could never run at all; the memory budget still bounds concurrency.
+            return True
+        if len(self._running) >= self.cpu_slots:
+            return False
+        if self.memory_budget is not None and self._memory_in_use + memory > self.memory_budget:
+            return False
+        return True
+
+    def _retry_after(self):
+        # Time until the running work (spread over the CPU slots) should drain
+        now = time.monotonic()
+        remaining = sum(max(0.0, t.seconds - (now - t.started)) for t in self._running)
+        return max(1, int(remaining / self.cpu_slots + 0.999))
+
+    def admit(self, size, kind):
+        """
+        Blocks until the job fits the budget and returns a Ticket.
+        Raises AdmissionRejected if the queue is full or the wait times out.
+        """
+        memory, seconds = estimate_cost(size, kind)
+        token = object()
+
+        with self._cond:
+            if not self._queue and self._fits(memory):
+                return self._start(memory, seconds)
+
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                raise AdmissionRejected("Server busy: compression queue is full", self._retry_after())
+
+            self._queue.append(token)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                # FIFO: only the head of the queue may start
+                while not (self._queue[0] is token and self._fits(memory)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise AdmissionRejected("Server busy: timed out waiting for capacity",
+                                                self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._queue.remove(token)
+                self._cond.notify_all()
+
+            return self._start(memory, seconds)
+
+    def reprice(self, ticket, size, kind):
+        """
+        Re-prices an admitted job once its real size is known (e.g. the output
+        size a decompression upload declares). A job that got cheaper keeps
+        its ticket; a dearer one releases it and queues again at the new
+        price. Returns the ticket to use; raises AdmissionRejected (with the
+        old ticket released) like admit().
+        """
+        memory, seconds = estimate_cost(size, kind)
+        if memory <= ticket.memory:
+            with self._cond:
+                if not ticket._released:
+                    self._memory_in_use -= ticket.memory - memory
+                    self._cond.notify_all()
+                ticket.memory, ticket.seconds = memory, seconds
+            return ticket
+        ticket.release()
+        return self.admit(size, kind)
+
+    def _start(self, memory, seconds):
+        ticket = Ticket(self, memory, seconds)
+        self._running.append(ticket)
+        self._memory_in_use += memory
+        self._admitted += 1
+        return ticket
+
+    def _release(self, ticket):
+        with self._cond:
+            self._running.remove(ticket)
+            self._memory_in_use -= ticket.memory
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'running': len(self._running),
+                'queue_depth': len(self._queue),
+                'cpu_slots': self.cpu_slots,
+                'memory_in_use': self._memory_in_use,
+                'memory_budget': self.memory_budget,
+                'admitted': self._admitted,
+                'rejected': self._rejected
+            }
@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import compress
+
+# --- Parallel Simulation Executor ---
+#
+# Runs the simulator's analyses in a reusable process pool instead of one
+# after another in the request thread. Huffman-only runs alongside the
+# LZW -> hybrid chain, and the LZW codes are computed once and shared, so
+# the wall-clock time is roughly that of the slower of the two branches.
+#
+# Every analysis has an input-size cap (larger inputs are analysed on their
+# prefix) and a deadline counted from its submission. Analyses that hit
+# either are reported in a final 'status' part instead of blocking the
+# response. A timed-out task still finishes in its worker (a pool process
+# cannot be interrupted), which is why the caps bound the work as well.
+# When LZW is truncated, 'sizes' reports lzw (and so the hybrid estimate)
+# from the full-input Huffman size only, never from a prefix.
+#
+# Workers come from a forkserver (spawn where that is unavailable): forking
+# the multi-threaded web server itself can deadlock. They re-import the
+# main script as __mp_main__, so app.py keeps its store setup out of that
+# import. Memory the analyses allocate lives in the workers and is not in
+# the request's PeakTracker figure.
+
+ANALYSIS_WORKERS = min(4, os.cpu_count() or 1)
+ANALYSIS_TIMEOUT = 20.0 # seconds per analysis
+ANALYSIS_LIMITS = {
+    'huffman': 2 * 1024 * 1024, # input bytes
+    'lzw': 2 * 1024 * 1024,
+    'hybrid': 2 * 1024 * 1024,  # packed LZW bytes
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                # Workers fork from a server that already has the codecs loaded
+                context.set_forkserver_preload(['analysis_pool'])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS, mp_context=context)
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- Worker tasks (module level so they pickle) ---
+
+def _huffman_task(data):
+    _, tree, binary = compress.huffman_compress_only(data)
+    return tree, binary
+
+
+def _lzw_task(data, raw_dict):
+    codes, dictionary = compress.lzw_encode(data)
+    if not raw_dict:
+        dictionary = {str(k): v for k, v in dictionary.items()}
+    return codes, dictionary, compress.lzw_pack_varwidth(codes)
+
+
+def _hybrid_task(lzw_data):
+    _, tree, binary = compress.huffman_compress_bytes_with_tree(lzw_data)
+    return tree, binary
+
+
+def simulate_parallel(text_input, raw_dict=False, timeout=ANALYSIS_TIMEOUT, limits=None):
+    """
+    Parallel simulate_stream: yields 'sizes' first, then 'lzw', 'huffman' and
+    'hybrid' (each only if it completed), then 'status' with
+    {"partial": {analysis: reason}} if anything was capped, timed out or failed.
+    """
+    if isinstance(text_input, str):
+        data = text_input.encode('utf-8')
+    else:
+        data = text_input
+    if not data:
+        return
+
+    limits = ANALYSIS_LIMITS if limits is None else limits
+    partial = {}
+    pool = get_pool()
+
+    def clip(name, payload):
+        limit = limits.get(name)
+        if limit is not None and len(payload) > limit:
+            partial[name] = f"input truncated to {limit} bytes"
+            return payload[:limit]
+        return payload
+
+    def submit(name, fn, *args):
+        try:
+            return pool.submit(fn, *args), time.monotonic() + timeout
+        except (BrokenProcessPool, RuntimeError) as e: # RuntimeError: raced shutdown()
+            _discard_pool(pool)
+            partial[name] = f"failed: {e}"
+            return None, 0
+
+    def result(name, job):
+        future, deadline = job
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            partial[name] = f"timed out after {timeout:g}s"
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            partial[name] = f"failed: {e}"
+        except Exception as e:
+            partial[name] = f"failed: {e}"
+        return None
+
+    huffman_job = submit('huffman', _huffman_task, clip('huffman', data))
+    lzw_job = submit('lzw', _lzw_task, clip('lzw', data), raw_dict)
+
+    # Cheap (no bit packing), so the parent computes it while the workers run
+    huff_size = compress.huffman_encoded_size(data)
+
+    lzw = result('lzw', lzw_job)
+    hybrid_job = (None, 0)
+    if lzw is not None:
+        hybrid_job = submit('hybrid', _hybrid_task, clip('hybrid', lzw[2]))
+    elif 'lzw' in partial:
+        partial.setdefault('hybrid', "skipped: LZW did not finish")
+
+    # Sizes of a truncated LZW run are of a prefix; don't mix them with full-input sizes
+    lzw_size = len(lzw[2]) if lzw is not None and 'lzw' not in partial else None
+    yield "sizes", compress.simulation_sizes(len(data), huff_size, lzw_size)
+    if lzw is not None:
+        yield "lzw", {"lzw_dict": lzw[1], "lzw_codes": lzw[0]}
+
+    huffman = result('huffman', huffman_job)
+    if huffman is not None:
+        yield "huffman", {"huffman_tree": huffman[0], "huffman_binary": huffman[1]}
+
+    hybrid = result('hybrid', hybrid_job)
+    if hybrid is not None:
+        hybrid_binary = hybrid[1]
+        if huffman is not None:
+            hybrid_binary = compress.force_hybrid_binary(hybrid_binary, huffman[1])
+        yield "hybrid", {"hybrid_tree": hybrid[0], "hybrid_binary": hybrid_binary}
+
+    if partial:
+        yield "status", {"partial": partial}
+
+
+def simulate_all_parallel(text_input, **options):
+    """simulate_all on the pool; adds 'partial' when some analysis is incomplete."""
+    results = {}
+    for _, payload in simulate_parallel(text_input, **options):
+        results.update(payload)
+    return results or None
@@ -1,9 +1,18 @@
 import os
 import json
-from flask import Flask, render_template, request, send_file, jsonify
+import uuid
+import atexit
+from flask import Flask, Response, render_template, request, send_file, jsonify
 from werkzeug.utils import secure_filename
 import compress
 import decompress
+import analysis_pool
+import payloads
+from artifact_store import ArtifactStore
+from chunk_store import ChunkStore, iter_inline_container
+from simulation_store import SimulationStore, ARTIFACTS
+from admission import AdmissionController, AdmissionRejected
+import memtrack
 
 app = Flask(__name__)
 
@@ -15,6 +24,63 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+# Per-node quotas for the uploads/ store (unset = unlimited)
+app.config['STORE_MAX_BYTES'] = _env_int('STORE_MAX_BYTES')
+app.config['STORE_MAX_FILES'] = _env_int('STORE_MAX_FILES')
+
+# analysis_pool workers re-import the main script as __mp_main__ (python
+# app.py); they must not adopt, clean or evict the stores of the server. Nor
+# must the debug reloader's parent process, which only watches for changes
+# and restarts the child that actually serves requests.
+RELOADER_PARENT = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+if __name__ != '__mp_main__' and not RELOADER_PARENT:
+    store = ArtifactStore(UPLOAD_FOLDER,
+                          max_bytes=app.config['STORE_MAX_BYTES'],
+                          max_files=app.config['STORE_MAX_FILES'],
+                          base_reader=decompress.delta_reference)
+    store.start()
+
+    # Deduplicated chunks behind 'dedup' (flag 6) artifacts; evicting a manifest
+    # releases its chunk references
+    chunks = ChunkStore(os.path.join(UPLOAD_FOLDER, '.chunks'))
+    store.on_evict = chunks.release
+
+    atexit.register(chunks.save)
+    atexit.register(store.stop)
+
+# Admission control: CPU slots, memory budget and queue for codec jobs
+admission = AdmissionController(cpu_slots=_env_int('ADMISSION_CPU_SLOTS'),
+                                memory_budget=_env_int('ADMISSION_MEMORY_BYTES'),
+                                max_queue=_env_int('ADMISSION_MAX_QUEUE') or 16,
+                                queue_timeout=_env_float('ADMISSION_QUEUE_TIMEOUT', 10.0))
+
+def busy_response(rejection):
+    response = jsonify({'error': str(rejection), 'retry_after': rejection.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+# Opt-in per-job peak memory tracking, and the estimated peak above which
+# codecs switch to their chunked low-memory paths
+app.config['MEMORY_TRACKING'] = os.environ.get('MEMORY_TRACKING', '') not in ('', '0')
+memtrack.memory_budget = _env_int('JOB_MEMORY_BUDGET')
+
+# Simulator analyses run on a shared process pool with per-analysis deadlines
+analysis_pool.ANALYSIS_TIMEOUT = _env_float('ANALYSIS_TIMEOUT', analysis_pool.ANALYSIS_TIMEOUT)
+
+# Packed simulator artifacts, paged out via /api/simulations/<id>/<artifact>
+simulations = SimulationStore()
+MAX_PAGE_ELEMENTS = 1 << 20
+
 def load_stats():
     if not os.path.exists(STATS_FILE):
         return {'compressed': 0, 'decompressed': 0}
@@ -43,7 +109,12 @@ def index():
 
 @app.route('/stats')
 def get_stats():
-    return jsonify(load_stats())
+    stats = load_stats()
+    stats['store'] = store.stats()
+    stats['chunks'] = chunks.stats()
+    stats['admission'] = admission.stats()
+    stats['memory'] = memtrack.metrics.snapshot()
+    return jsonify(stats)
 
 @app.route('/reset_stats', methods=['POST'])
 def reset_stats():
@@ -59,74 +130,246 @@ def process():
     
     file = request.files['file']
     mode = request.form.get('mode')
+    codec = request.form.get('codec', 'lzma')
+    if codec not in compress.CODECS:
+        return jsonify({'error': f'Unknown codec: {codec}'})
+    # 'adaptive' enables ratio-monitored LZW dictionary resets
+    lzw_reset = request.form.get('lzw_reset', 'full')
+    if lzw_reset not in ('full', 'adaptive'):
+        return jsonify({'error': f'Unknown lzw_reset policy: {lzw_reset}'})
+    # base_id names a stored artifact (e.g. the previous version's .lzh);
+    # compressing against it switches to the delta codec
+    base_id = secure_filename(request.form.get('base_id', ''))
+    if base_id and mode == 'compress':
+        if base_id not in store:
+            return jsonify({'error': f'Unknown base file: {base_id}'}), 404
+        codec = 'delta'
+    elif codec == 'delta':
+        return jsonify({'error': 'The delta codec needs a base_id'})
     
     if file.filename == '':
         return jsonify({'error': 'No selected file'})
 
     if file:
+        # Price the job from the request size before writing the upload out
+        # (request.files has already spooled it, but no codec has run yet)
+        kind = 'decompress' if mode == 'decompress' else codec
+        try:
+            ticket = admission.admit(request.content_length or 0, kind)
+        except AdmissionRejected as rejection:
+            return busy_response(rejection)
+
         filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_path)
-        
-        original_size = os.path.getsize(input_path)
-        tree_data = None
-        
-        if mode == 'compress':
+        # Uploads go to a scratch path and are deleted once processed;
+        # only outputs are kept (and quota-managed) in the store.
+        input_path = store.incoming_path(filename)
+        try:
+            file.save(input_path)
+            if mode == 'decompress':
+                # A small .lzh can declare a huge output: price it on that
+                declared = decompress.declared_output_size(input_path)
+                if declared is not None:
+                    ticket = admission.reprice(ticket, declared, kind)
+            if codec == 'delta':
+                # Keep the base from being evicted or overwritten until the
+                # delta is registered as depending on it
+                store.pin(base_id)
             try:
-                # Get Tree Data here
-                # Preserve original extension so we can restore it properly
-                base_name = filename + '.lzh'
-                output_path = os.path.join(app.config['UPLOAD_FOLDER'], base_name)
-                tree_data = compress.compress_file(input_path, output_path)
-                update_stats('compress')
-                
-                output_filename = base_name
-            except Exception as e:
-                return jsonify({'error': str(e)})
-                
-        elif mode == 'decompress':
-            # Preserve original filename by stripping the .lzh suffix
-            if filename.endswith('.lzh'):
-                output_filename = filename[:-4]
-            elif filename.endswith('.bin'):
-                 output_filename = filename[:-4]
-            else:
-                output_filename = filename + '.restored'
-            
-            output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+                return process_upload(filename, input_path, mode, codec, lzw_reset, base_id)
+            finally:
+                if codec == 'delta':
+                    store.unpin(base_id)
+        except AdmissionRejected as rejection:
+            return busy_response(rejection)
+        finally:
+            ticket.release()
+            store.discard(input_path)
+
+def load_artifact(name, depth=0):
+    """Original content of a stored artifact (decoding .lzh outputs), used as a delta reference."""
+    # Deltas may reference other deltas; bound the chain we are willing to decode
+    if depth > decompress.MAX_DELTA_DEPTH:
+        raise ValueError("Delta chain is too long")
+    name = secure_filename(name)
+    if name not in store:
+        raise ValueError(f"Reference artifact '{name}' is no longer stored")
+    store.pin(name)
+    try:
+        if not name.endswith('.lzh'):
+            with open(store.path(name), 'rb') as f:
+                return f.read()
+        scratch = store.incoming_path(name)
+        try:
+            decompress.decompress_file(store.path(name), scratch, low_memory=False, chunk_store=chunks,
+                                       reference_resolver=lambda ref: load_artifact(ref, depth + 1))
+            with open(scratch, 'rb') as f:
+                return f.read()
+        finally:
+            store.discard(scratch)
+    finally:
+        store.unpin(name)
+
+def output_name(name):
+    """name, or a fresh rev-prefixed name if an artifact that must be kept (pinned, or a delta's base) has it."""
+    if store.in_use(name):
+        return f"rev{uuid.uuid4().hex[:8]}_{name}"
+    return name
+
+def process_upload(filename, input_path, mode, codec='lzma', lzw_reset='full', base_id=''):
+    """Runs the codec on a saved upload and registers the output in the store."""
+    original_size = os.path.getsize(input_path)
+    tree_data = None
+    kind = 'decompress' if mode == 'decompress' else codec
+    # Decompression is priced inside its try below (it reads the upload's header)
+    low_memory = memtrack.needs_low_memory(original_size, kind) if mode == 'compress' else False
+    tracker = memtrack.PeakTracker(kind, app.config['MEMORY_TRACKING'], low_memory)
+    reset_policy = compress.RatioResetPolicy() if lzw_reset == 'adaptive' else None
+    
+    if mode == 'compress':
+        try:
+            # Get Tree Data here
+            # Preserve original extension so we can restore it properly
+            # A new revision uploaded under its base's name must not overwrite it
+            base_name = output_name(filename + '.lzh')
+            output_path = os.path.join(app.config['UPLOAD_FOLDER'], base_name)
+            with tracker:
+                reference = load_artifact(base_id) if codec == 'delta' else None
+                tree_data = compress.compress_file(input_path, output_path, codec=codec,
+                                                   low_memory=low_memory,
+                                                   reset_policy=reset_policy,
+                                                   chunk_store=chunks,
+                                                   reference=reference,
+                                                   reference_name=base_id)
+            update_stats('compress')
             
-            try:
-                decompress.decompress_file(input_path, output_path)
-                update_stats('decompress')
-            except Exception as e:
-                 return jsonify({'error': str(e)})
+            output_filename = base_name
+        except Exception as e:
+            return jsonify({'error': str(e)})
             
-            # For consistency, return empty debug info on decompress for now
-            # debug_info = {"original_preview": "", "compressed_preview": ""} 
-        
+    elif mode == 'decompress':
+        # Preserve original filename by stripping the .lzh suffix
+        if filename.endswith('.lzh'):
+            output_filename = filename[:-4]
+        elif filename.endswith('.bin'):
+             output_filename = filename[:-4]
         else:
-            return jsonify({'error': 'Invalid mode'})
-
-        if not os.path.exists(output_path):
-             return jsonify({'error': 'Processing failed to create output file'})
-
-        processed_size = os.path.getsize(output_path)
+            output_filename = filename + '.restored'
+        output_filename = output_name(output_filename)
+        
+        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
         
-        # Determine if it was Identity Mode
-        is_identity = (processed_size == original_size + 1)
+        try:
+            # Priced on the declared output size: a small .lzh can hold a huge file
+            low_memory = tracker.low_memory = decompress.needs_low_memory(input_path)
+            with tracker:
+                decompress.decompress_file(input_path, output_path, low_memory=low_memory,
+                                           chunk_store=chunks, reference_resolver=load_artifact)
+            update_stats('decompress')
+        except Exception as e:
+             return jsonify({'error': str(e)})
         
-        return jsonify({
-            'original_size': original_size,
-            'processed_size': processed_size,
-            'filename': output_filename,
-            'download_url': f'/download/{output_filename}',
-            'tree_data': tree_data,
-            'is_identity': is_identity
-        })
+        # For consistency, return empty debug info on decompress for now
+        # debug_info = {"original_preview": "", "compressed_preview": ""} 
+    
+    else:
+        return jsonify({'error': 'Invalid mode'})
+
+    if not os.path.exists(output_path):
+         return jsonify({'error': 'Processing failed to create output file'})
+
+    processed_size = os.path.getsize(output_path)
+    if mode == 'compress' and codec == 'dedup':
+        # Charge the manifest with the chunk bytes it keeps alive
+        store.add(output_filename, size=processed_size + chunks.manifest_bytes(output_filename))
+    else:
+        chunks.release(output_filename) # an older dedup output of the same name
+        # A delta keeps its base stored (see ArtifactStore) for as long as it is
+        store.add(output_filename, base=base_id if mode == 'compress' and codec == 'delta' else None)
+    
+    # Determine if it was Identity Mode
+    is_identity = (processed_size == original_size + 1)
+    
+    return jsonify({
+        'original_size': original_size,
+        'processed_size': processed_size,
+        'filename': output_filename,
+        'download_url': f'/download/{output_filename}',
+        'tree_data': tree_data,
+        'is_identity': is_identity,
+        'low_memory': low_memory,
+        'peak_memory': tracker.peak_bytes,
+        'lzw_resets': reset_policy.stats() if reset_policy else None,
+        'base_id': base_id if codec == 'delta' else None,
+        # The codec actually written ('auto' and the low-memory path can differ)
+        'codec': compress.written_codec(output_path) if mode == 'compress' else None
+    })
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_file(os.path.join(app.config['UPLOAD_FOLDER'], filename), as_attachment=True)
+    filename = secure_filename(filename)
+    if not store.touch(filename):
+        return jsonify({'error': 'File not found (it may have expired)'}), 404
+    store.pin(filename)
+    streaming = False
+    try:
+        path = store.path(filename)
+        with open(path, 'rb') as f:
+            manifest = f.read() if f.read(1) == b'\x06' else None
+        if manifest is None:
+            response = send_file(path, as_attachment=True)
+            base = store.base_of(filename)
+            if base is not None:
+                # Deltas only decode next to their base: download it as well and
+                # keep it in the same directory (decompress.py looks there)
+                response.headers['X-Delta-Base'] = base
+            return response
+
+        # Chunk manifests only make sense next to this node's chunk store, so
+        # downloads get the self-contained form (flag 7) with the stored chunks
+        # inline; the pin keeps the chunks alive until the stream is closed
+        response = Response(iter_inline_container(manifest, chunks),
+                            mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.call_on_close(lambda: store.unpin(filename))
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            store.unpin(filename)
+
+# Small in-memory payloads: raw body in, .lzh bytes out, no upload or store
+# round trip. Capped in size, so they skip admission.
+MAX_INLINE_PAYLOAD = 64 * 1024
+
+def read_inline_payload():
+    if (request.content_length or 0) > MAX_INLINE_PAYLOAD:
+        return None
+    data = request.get_data(cache=False)
+    return data if len(data) <= MAX_INLINE_PAYLOAD else None
+
+def too_large_response():
+    return jsonify({'error': f'Payloads over {MAX_INLINE_PAYLOAD} bytes go through /process'}), 413
+
+@app.route('/api/compress', methods=['POST'])
+def api_compress():
+    codec = request.args.get('codec', 'lzw')
+    if codec not in payloads.PAYLOAD_CODECS:
+        return jsonify({'error': f'Unknown codec: {codec}'}), 400
+    data = read_inline_payload()
+    if data is None:
+        return too_large_response()
+    return Response(payloads.compress_payload(data, codec), mimetype='application/octet-stream')
+
+@app.route('/api/decompress', methods=['POST'])
+def api_decompress():
+    data = read_inline_payload()
+    if data is None:
+        return too_large_response()
+    try:
+        output = payloads.decompress_payload(data, MAX_INLINE_PAYLOAD)
+    except Exception as e:
+        return jsonify({'error': f'Could not decode payload: {e}'}), 400
+    return Response(output, mimetype='application/octet-stream')
 
 @app.route('/simulator')
 def simulator():
@@ -139,8 +382,80 @@ def api_simulate():
     if not text:
         return jsonify({'error': 'No text provided'}), 400
     
-    results = compress.simulate_all(text)
+    try:
+        ticket = admission.admit(len(text), 'simulate')
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+
+    with ticket, memtrack.PeakTracker('simulate', app.config['MEMORY_TRACKING']) as tracker:
+        results = analysis_pool.simulate_all_parallel(text, timeout=analysis_pool.ANALYSIS_TIMEOUT)
+    if results is not None and tracker.peak_bytes is not None:
+        # This process only: the analyses allocate in the pool's workers
+        results['peak_memory'] = tracker.peak_bytes
     return jsonify(results)
 
+@app.route('/api/simulate/stream', methods=['POST'])
+def api_simulate_stream():
+    """
+    Streams the simulation as NDJSON: one {"part": ..., ...} object per line,
+    sent as soon as that analysis finishes (sizes first, then lzw, huffman,
+    hybrid, and 'status' listing analyses that were capped or timed out).
+    Bit strings, LZW codes and the dictionary are not inlined: each is kept
+    packed under the simulation 'id' (sent with 'sizes') and replaced by an
+    <artifact>_count field; fetch them from /api/simulations/<id>/<artifact>.
+    """
+    data = request.json
+    text = data.get('text', '')
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    try:
+        ticket = admission.admit(len(text), 'simulate')
+    except AdmissionRejected as rejection:
+        return busy_response(rejection)
+
+    sim_id = simulations.create()
+
+    def generate():
+        for part, payload in analysis_pool.simulate_parallel(text, raw_dict=True,
+                                                             timeout=analysis_pool.ANALYSIS_TIMEOUT):
+            compact = simulations.compact_part(sim_id, payload)
+            if part == 'sizes':
+                compact['id'] = sim_id
+            yield json.dumps({'part': part, **compact}) + '\n'
+
+    # X-Accel-Buffering stops reverse proxies from holding back the chunks
+    response = Response(generate(), mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The job runs while the body streams, so hold the slot until it is closed
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route('/api/simulations/<sim_id>/<artifact>')
+def api_simulation_artifact(sim_id, artifact):
+    """
+    Packed window of one simulation artifact (see simulation_store for layouts).
+    offset/limit count elements: bits, codes or dictionary records.
+    """
+    if artifact not in ARTIFACTS:
+        return jsonify({'error': f'Unknown artifact: {artifact}'}), 404
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', MAX_PAGE_ELEMENTS)), MAX_PAGE_ELEMENTS)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    window = simulations.read(sim_id, artifact, offset, limit)
+    if window is None:
+        return jsonify({'error': 'Simulation not found (it may have expired)'}), 404
+
+    payload, total, count = window
+    return Response(payload, mimetype='application/octet-stream', headers={
+        'X-Total-Count': str(total),
+        'X-Offset': str(max(0, min(offset, total))),
+        'X-Count': str(count),
+        'Cache-Control': 'private, max-age=300'
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
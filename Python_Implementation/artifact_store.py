@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+from collections import OrderedDict
+
+# --- Bounded Artifact Store ---
+#
+# Keeps the uploads/ folder under a byte and file-count quota. The store keeps
+# an in-memory LRU index (persisted as JSON) so quota checks never need to
+# list the directory. The index is written whenever an artifact is added or
+# removed; start-up reconciles it with the directory in a single scandir
+# pass, adopting files it does not know (written after the last save) and
+# dropping entries whose file is gone. A daemon thread evicts
+# least-recently-downloaded artifacts whenever the quota is exceeded.
+#
+# An artifact can name a base it depends on (a delta's reference). Bases
+# are reference counted: while anything depends on them they are never
+# evicted or removed.
+
+INDEX_NAME = '.store_index.json'
+INCOMING_DIR = '.incoming'
+
+
+class ArtifactStore:
+    def __init__(self, root, max_bytes=None, max_files=None, evict_interval=30.0, base_reader=None):
+        """base_reader(path) -> base name or None, for files adopted from disk."""
+        self.root = root
+        self.base_reader = base_reader
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.evict_interval = evict_interval
+
+        # name -> {'size': int, 'atime': float, 'base': str or None}; ordered oldest access first
+        self._index = OrderedDict()
+        self._dependents = {} # base name -> number of stored artifacts depending on it
+        self._total_bytes = 0
+        self._pinned = {}
+        self._evictions = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.on_evict = None # Optional callback(name) after an artifact is deleted
+
+        # Scratch uploads left behind by a crash are never worth keeping
+        incoming = os.path.join(root, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        for leftover in os.listdir(incoming):
+            self.discard(os.path.join(incoming, leftover))
+
+        self._load_index()
+
+    # --- Index persistence ---
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def _load_index(self):
+        entries = None
+        if os.path.exists(self._index_path()):
+            try:
+                with open(self._index_path(), 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = None
+
+        if entries is None:
+            entries = [] # first start (or lost index)
+
+        on_disk = {}
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith(INDEX_NAME):
+                    on_disk[entry.name] = entry.stat()
+
+        kept = [[name, size, atime, rest[0] if rest else None]
+                for name, size, atime, *rest in entries if name in on_disk]
+        known = {entry[0] for entry in kept}
+        adopted = [[name, st.st_size, st.st_mtime,
+                    self.base_reader(self.path(name)) if self.base_reader else None]
+                   for name, st in on_disk.items() if name not in known]
+        if adopted or len(kept) != len(entries):
+            self._dirty = True
+        entries = sorted(kept + adopted, key=lambda e: e[2])
+
+        for name, size, atime, base in entries:
+            self._index[name] = {'size': size, 'atime': atime, 'base': base}
+            self._total_bytes += size
+            if base is not None:
+                self._dependents[base] = self._dependents.get(base, 0) + 1
+
+    def save_index(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = [[name, meta['size'], meta['atime'], meta['base']]
+                           for name, meta in self._index.items()]
+                self._dirty = False
+
+            tmp_path = self._index_path() + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self._index_path())
+
+    # --- Artifact API ---
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def incoming_path(self, filename):
+        """Unique scratch path for an upload; delete it with discard() once processed."""
+        return os.path.join(self.root, INCOMING_DIR, f"{uuid.uuid4().hex}_{filename}")
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def add(self, name, size=None, base=None):
+        """
+        Registers (or re-registers) an artifact already written to path(name).
+        size overrides the bytes charged against the quota (e.g. for chunk
+        manifests, whose data lives in the chunk store). base names a stored
+        artifact this one needs in order to be decoded.
+        """
+        if size is None:
+            size = os.path.getsize(self.path(name))
+        with self._lock:
+            old = self._index.pop(name, None)
+            if old:
+                self._total_bytes -= old['size']
+                self._drop_base(old)
+            self._index[name] = {'size': size, 'atime': time.time(), 'base': base}
+            self._total_bytes += size
+            if base is not None:
+                self._dependents[base] = self._dependents.get(base, 0) + 1
+            self._dirty = True
+            over = self._over_quota()
+        self.save_index()
+        if over:
+            self._wakeup.set()
+
+    def touch(self, name):
+        """Marks an artifact as recently downloaded. Returns False if it is unknown."""
+        with self._lock:
+            meta = self._index.get(name)
+            if meta is None:
+                return False
+            meta['atime'] = time.time()
+            self._index.move_to_end(name)
+            self._dirty = True
+        return True
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._index
+
+    def has_dependents(self, name):
+        """True while a stored artifact needs name as its base."""
+        with self._lock:
+            return name in self._dependents
+
+    def in_use(self, name):
+        """True while name is pinned or is the base of another artifact (do not overwrite it)."""
+        with self._lock:
+            return name in self._pinned or name in self._dependents
+
+    def base_of(self, name):
+        with self._lock:
+            meta = self._index.get(name)
+            return meta['base'] if meta else None
+
+    def _drop_base(self, meta):
+        base = meta['base']
+        if base is None:
+            return
+        count = self._dependents.get(base, 0) - 1
+        if count > 0:
+            self._dependents[base] = count
+        else:
+            self._dependents.pop(base, None)
+
+    def remove(self, name):
+        """Deletes an artifact; raises ValueError while others depend on it."""
+        with self._lock:
+            if name in self._dependents:
+                raise ValueError(f"'{name}' is the base of {self._dependents[name]} stored artifact(s)")
+            meta = self._index.pop(name, None)
+            if meta is None:
+                return
+            self._total_bytes -= meta['size']
+            self._drop_base(meta)
+            self._dirty = True
+        self.discard(self.path(name))
+        self.save_index()
+        if self.on_evict:
+            self.on_evict(name)
+
+    def pin(self, name):
+        """Protects an artifact from eviction while a request is using it."""
+        with self._lock:
+            self._pinned[name] = self._pinned.get(name, 0) + 1
+
+    def unpin(self, name):
+        with self._lock:
+            count = self._pinned.get(name, 0) - 1
+            if count > 0:
+                self._pinned[name] = count
+            else:
+                self._pinned.pop(name, None)
+
+    # --- Eviction ---
+
+    def _over_quota(self):
+        if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+            return True
+        if self.max_files is not None and len(self._index) > self.max_files:
+            return True
+        return False
+
+    def evict(self):
+        """Deletes least-recently-used artifacts until the store is within quota."""
+        evicted = []
+        with self._lock:
+            for name in list(self._index):
+                if not self._over_quota():
+                    break
+                if name in self._pinned or name in self._dependents:
+                    continue
+                meta = self._index.pop(name)
+                self._total_bytes -= meta['size']
+                self._drop_base(meta)
+                evicted.append(name)
+            if evicted:
+                self._evictions += len(evicted)
+                self._dirty = True
+
+        for name in evicted:
+            self.discard(self.path(name))
+            if self.on_evict:
+                self.on_evict(name)
+        if evicted:
+            self.save_index()
+        return evicted
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.evict_interval)
+            self._wakeup.clear()
+            self.evict()
+            self.save_index()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='artifact-evictor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._index),
+                'bytes': self._total_bytes,
+                'max_files': self.max_files,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions
+            }
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import compress
+
+# --- Incremental Batch Compression ---
+#
+# Walks a directory tree and compresses every file into a mirrored tree of
+# .lzh files using a process pool. A manifest (size, mtime, sha256) kept in
+# the output directory lets repeat runs skip files that have not changed.
+
+MANIFEST_NAME = '.lzh_manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024 # 1MB
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A corrupt manifest only costs us one full run
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    # Write to a temp file first so an interrupted run never truncates the manifest
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def walk_files(input_dir, output_dir):
+    """Yields paths relative to input_dir, skipping the output tree if nested inside."""
+    output_real = os.path.realpath(output_dir)
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs
+                         if os.path.realpath(os.path.join(root, d)) != output_real)
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            if os.path.isfile(full_path):
+                yield os.path.relpath(full_path, input_dir).replace(os.sep, '/')
+
+
+def compress_job(input_path, output_path, previous_hash):
+    """
+    Worker: hashes the file and compresses it unless the content is unchanged.
+    Returns the new manifest entry and whether compression actually ran.
+    """
+    st = os.stat(input_path)
+    content_hash = file_sha256(input_path)
+
+    compressed = False
+    if content_hash != previous_hash or not os.path.exists(output_path):
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        if st.st_size == 0:
+            # compress_file writes nothing for empty input; a bare Identity
+            # (flag 2) header still gives the file a .lzh that restores
+            with open(output_path, 'wb') as f:
+                f.write(b'\x02')
+        else:
+            compress.compress_file(input_path, output_path, with_tree=False)
+        compressed = True
+
+    entry = {
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+        'sha256': content_hash,
+        'compressed_size': os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    }
+    return entry, compressed
+
+
+def batch_compress(input_dir, output_dir, workers=None, prune=False, verbose=True):
+    """
+    Compresses every changed file under input_dir into output_dir.
+    Returns a summary dict with compressed/skipped/failed/removed counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    new_manifest = {}
+    summary = {'compressed': 0, 'skipped': 0, 'failed': 0, 'removed': 0}
+
+    pending = []
+    for rel_path in walk_files(input_dir, output_dir):
+        input_path = os.path.join(input_dir, rel_path)
+        output_path = os.path.join(output_dir, rel_path + '.lzh')
+        st = os.stat(input_path)
+        old = manifest.get(rel_path)
+
+        # Fast path: size and mtime match, so don't even read the file
+        if (old and old.get('size') == st.st_size and old.get('mtime') == st.st_mtime_ns
+                and os.path.exists(output_path)):
+            new_manifest[rel_path] = old
+            summary['skipped'] += 1
+            continue
+
+        pending.append((rel_path, input_path, output_path, old.get('sha256') if old else None))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(compress_job, input_path, output_path, previous_hash): rel_path
+                for rel_path, input_path, output_path, previous_hash in pending
+            }
+            for future in as_completed(futures):
+                rel_path = futures[future]
+                try:
+                    entry, compressed = future.result()
+                except Exception as e:
+                    summary['failed'] += 1
+                    if verbose:
+                        print(f"FAILED  {rel_path}: {e}", file=sys.stderr)
+                    continue
+
+                new_manifest[rel_path] = entry
+                if compressed:
+                    summary['compressed'] += 1
+                    if verbose:
+                        print(f"packed  {rel_path} ({entry['size']} -> {entry['compressed_size']} bytes)")
+                else:
+                    # mtime moved but the content hash did not: just refresh the manifest
+                    summary['skipped'] += 1
+
+    # Sources that disappeared since the last run
+    for rel_path in manifest:
+        if rel_path not in new_manifest and not os.path.exists(os.path.join(input_dir, rel_path)):
+            summary['removed'] += 1
+            if prune:
+                stale_output = os.path.join(output_dir, rel_path + '.lzh')
+                if os.path.exists(stale_output):
+                    os.remove(stale_output)
+
+    save_manifest(output_dir, new_manifest)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally compress a directory tree into .lzh files.")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--prune', action='store_true',
+                        help="delete .lzh files whose source no longer exists")
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args()
+
+    result = batch_compress(args.input_dir, args.output_dir, workers=args.jobs,
+                            prune=args.prune, verbose=not args.quiet)
+    print(f"Compressed: {result['compressed']}  Skipped: {result['skipped']}  "
+          f"Failed: {result['failed']}  Removed: {result['removed']}")
+    if result['failed']:
+        sys.exit(1)
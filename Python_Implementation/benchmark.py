@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import lzma
+
+import compress
+import decompress
+from generate_log import generate_log_file
+
+# --- Codec Benchmark ---
+#
+# Compares the production codecs on the same inputs: ratio, compression and
+# decompression throughput. Every result is round-tripped before it is reported.
+#
+#   python benchmark.py [file ...]     (default: a generated 10MB server log)
+
+CODECS = [
+    ("lzma -6", lambda d: lzma.compress(d, preset=6), lzma.decompress),
+    ("lzma -9", lambda d: lzma.compress(d, preset=9), lzma.decompress),
+    ("lzma+flt", compress.lzma_filtered_compress, lzma.decompress),
+    ("hybrid", compress.hybrid_compress_bytes, decompress.hybrid_decompress_bytes),
+    ("lzw", lambda d: compress.lzw_compress(d, variable_width=True),
+     lambda d: decompress.lzw_decompress(d, variable_width=True)),
+]
+
+
+def time_call(fn, arg):
+    start = time.perf_counter()
+    result = fn(arg)
+    return result, time.perf_counter() - start
+
+
+def benchmark_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    size_mb = len(data) / (1024 * 1024)
+
+    print(f"\n{path} ({len(data)} bytes)")
+    print(f"{'codec':<10} {'size':>12} {'ratio':>8} {'comp MB/s':>10} {'decomp MB/s':>12}")
+    for name, encode, decode in CODECS:
+        packed, enc_time = time_call(encode, data)
+        restored, dec_time = time_call(decode, packed)
+        if restored != data:
+            raise RuntimeError(f"{name} failed to round-trip {path}")
+        ratio = len(data) / len(packed) if packed else 0
+        print(f"{name:<10} {len(packed):>12} {ratio:>7.1f}x "
+              f"{size_mb / enc_time:>10.2f} {size_mb / dec_time:>12.2f}")
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:]
+    if not paths:
+        paths = ["example_server.log"]
+        if not os.path.exists(paths[0]):
+            generate_log_file(paths[0], 10)
+
+    for path in paths:
+        benchmark_file(path)
@@ -0,0 +1,313 @@
+import os
+import json
+import lzma
+import random
+import struct
+import hashlib
+import threading
+
+# --- Content-Defined Chunking + Deduplicated Chunk Store ---
+#
+# Uploads are cut into variable-size chunks at content-defined boundaries
+# (a gear rolling hash), so an edit early in a file only changes the chunks
+# around it instead of shifting every fixed-size block. Each unique chunk is
+# compressed once and stored under its SHA-256; a file becomes a manifest of
+# chunk references (flag 6 in the .lzh container).
+#
+# Chunks are reference counted per manifest name. ArtifactStore evictions
+# call release(name), and chunks nobody references any more are deleted.
+
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024 # must be a power of two
+MAX_CHUNK = 256 * 1024
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+# Fixed seed: boundaries must be identical across runs and nodes
+_gear_rng = random.Random(0x6765617248)
+GEAR = [_gear_rng.getrandbits(64) for _ in range(256)]
+
+# Stored chunk blob = codec byte + payload
+BLOB_RAW = 0
+BLOB_LZMA = 1
+LZMA_FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 6}]
+
+INDEX_NAME = 'index.json'
+
+
+def chunk_boundaries(data, min_size=MIN_CHUNK, avg_size=AVG_CHUNK, max_size=MAX_CHUNK):
+    """
+    Yields chunk end offsets. The boundary test looks at the top bits of a
+    64-bit gear hash, which depend on the last ~64 bytes of input. The first
+    min_size bytes of each chunk are skipped without hashing.
+    """
+    bits = avg_size.bit_length() - 1
+    mask = ((1 << bits) - 1) << (64 - bits)
+    gear = GEAR
+    n = len(data)
+    start = 0
+    while start < n:
+        end = min(n, start + max_size)
+        i = start + min_size
+        if i >= end:
+            yield end
+            start = end
+            continue
+        h = 0
+        while i < end:
+            h = ((h << 1) + gear[data[i]]) & MASK64
+            i += 1
+            if not h & mask:
+                break
+        yield i
+        start = i
+
+
+def iter_chunks(data, **sizes):
+    start = 0
+    for end in chunk_boundaries(data, **sizes):
+        yield data[start:end]
+        start = end
+
+
+def iter_file_chunks(f, read_size=4 * MAX_CHUNK, **sizes):
+    """
+    iter_chunks over a binary file object, holding at most read_size +
+    max_size bytes. A boundary only depends on the max_size bytes after its
+    chunk's start, so the chunks are the same as for the whole file; a cut
+    at the end of the buffer is retried once more data has been read.
+    """
+    max_size = sizes.get('max_size', MAX_CHUNK)
+    buf = b''
+    eof = False
+    while not eof:
+        block = f.read(read_size)
+        eof = not block
+        buf += block
+        start = 0
+        for end in chunk_boundaries(buf, **sizes):
+            if not eof and end == len(buf) and end - start < max_size:
+                break
+            yield buf[start:end]
+            start = end
+        buf = buf[start:]
+
+
+def pack_blob(chunk):
+    packed = lzma.compress(chunk, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    if len(packed) < len(chunk):
+        return bytes([BLOB_LZMA]) + packed
+    return bytes([BLOB_RAW]) + chunk
+
+
+def unpack_blob(blob):
+    if blob[0] == BLOB_LZMA:
+        return lzma.decompress(blob[1:], format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    if blob[0] == BLOB_RAW:
+        return bytes(blob[1:])
+    raise ValueError(f"Unknown chunk codec: {blob[0]}")
+
+
+class ChunkStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._manifests = {} # name -> [digest, ...]
+        self._refs = {}      # digest -> refcount
+        self._sizes = {}     # digest -> stored (compressed) bytes
+        self._pending = {}   # digest -> Event, set once its first put() finished
+        self._stored_bytes = 0
+        self._dedup_hits = 0
+        self._load()
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load(self):
+        if os.path.exists(self._index_path()):
+            try:
+                with open(self._index_path(), 'r') as f:
+                    self._manifests = json.load(f)
+            except (OSError, ValueError):
+                self._manifests = {}
+        for digests in self._manifests.values():
+            for digest in digests:
+                self._refs[digest] = self._refs.get(digest, 0) + 1
+
+        # One scan at start-up: drop chunks orphaned by a crash, size the rest
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            for chunk in os.scandir(entry.path):
+                if chunk.name in self._refs:
+                    self._sizes[chunk.name] = chunk.stat().st_size
+                    self._stored_bytes += self._sizes[chunk.name]
+                else:
+                    os.remove(chunk.path)
+
+    def _save(self):
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifests, f)
+        os.replace(tmp_path, self._index_path())
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    # --- Chunks ---
+
+    def put(self, chunk):
+        """
+        Stores a chunk (compressing it only if it is new) and takes one
+        reference on it for the caller; hand it to commit() or drop().
+        """
+        digest = hashlib.sha256(chunk).hexdigest()
+        while True:
+            with self._lock:
+                pending = self._pending.get(digest)
+                if pending is None:
+                    if digest in self._refs:
+                        self._refs[digest] += 1
+                        self._dedup_hits += 1
+                        return digest
+                    # Reserve before compressing so a concurrent release can't delete it
+                    self._refs[digest] = 1
+                    self._pending[digest] = threading.Event()
+                    break
+            # Another put() is still writing this chunk; dedup once it has landed
+            pending.wait()
+
+        path = self._chunk_path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            blob = pack_blob(chunk)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._unref([digest])
+                self._pending.pop(digest).set()
+            raise
+        with self._lock:
+            self._sizes[digest] = len(blob)
+            self._stored_bytes += len(blob)
+            self._pending.pop(digest).set()
+        return digest
+
+    def blob(self, digest):
+        with open(self._chunk_path(digest), 'rb') as f:
+            return f.read()
+
+    def get(self, digest):
+        try:
+            chunk = unpack_blob(self.blob(digest))
+        except FileNotFoundError:
+            raise ValueError(f"Missing chunk {digest} (manifest refers to a purged chunk)")
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise ValueError(f"Corrupt chunk {digest} (SHA-256 mismatch)")
+        return chunk
+
+    # --- Manifests ---
+
+    def commit(self, name, digests):
+        """Records the manifest 'name' using references already taken by put()."""
+        with self._lock:
+            old = self._manifests.pop(name, None)
+            self._manifests[name] = list(digests)
+            self._unref(old or [])
+            self._save()
+
+    def drop(self, digests):
+        """Returns references taken by put() for a manifest that was never committed."""
+        with self._lock:
+            self._unref(digests)
+
+    def release(self, name):
+        with self._lock:
+            digests = self._manifests.pop(name, None)
+            if digests is None:
+                return
+            self._unref(digests)
+            self._save()
+
+    def manifest_bytes(self, name):
+        """
+        Stored bytes of every chunk the manifest references. Shared chunks are
+        counted in full for each manifest, so quotas built on this err on the
+        side of evicting early.
+        """
+        with self._lock:
+            return sum(self._sizes.get(digest, 0) for digest in self._manifests.get(name, ()))
+
+    def _unref(self, digests):
+        # Deletes under the lock, so a concurrent put() of the same chunk
+        # either still sees the reference or rewrites the file afterwards
+        for digest in digests:
+            count = self._refs.get(digest, 0) - 1
+            if count > 0:
+                self._refs[digest] = count
+                continue
+            self._refs.pop(digest, None)
+            self._stored_bytes -= self._sizes.pop(digest, 0)
+            try:
+                os.remove(self._chunk_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'manifests': len(self._manifests),
+                'chunks': len(self._refs),
+                'stored_bytes': self._stored_bytes,
+                'dedup_hits': self._dedup_hits
+            }
+
+
+# --- Container Payloads ---
+#
+# Flag 6 (manifest):   <Q total_size> <L count> count x (<32s sha256> <L raw_length>)
+# Flag 7 (inline):     <Q total_size> <L count> count x (<L raw_length> <L blob_length> blob)
+# Flag 7 is what downloads get: self-contained, built by concatenating the
+# already-compressed blobs without recompressing anything.
+
+MANIFEST_ENTRY = struct.Struct('<32sL')
+INLINE_ENTRY = struct.Struct('<LL')
+HEADER = struct.Struct('<QL')
+
+
+def pack_manifest(entries):
+    """entries: list of (hex digest, raw length)."""
+    total = sum(length for _, length in entries)
+    out = bytearray(HEADER.pack(total, len(entries)))
+    for digest, length in entries:
+        out.extend(MANIFEST_ENTRY.pack(bytes.fromhex(digest), length))
+    return bytes(out)
+
+
+def unpack_manifest(payload):
+    total, count = HEADER.unpack_from(payload, 0)
+    entries = []
+    pos = HEADER.size
+    for _ in range(count):
+        digest, length = MANIFEST_ENTRY.unpack_from(payload, pos)
+        entries.append((digest.hex(), length))
+        pos += MANIFEST_ENTRY.size
+    return total, entries
+
+
+def iter_inline_container(manifest_payload, store):
+    """Yields a flag 7 container (including the flag byte) for a flag 6 manifest payload."""
+    total, entries = unpack_manifest(manifest_payload)
+    yield b'\x07' + HEADER.pack(total, len(entries))
+    for digest, length in entries:
+        blob = store.blob(digest)
+        yield INLINE_ENTRY.pack(length, len(blob)) + blob
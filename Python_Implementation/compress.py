@@ -1,19 +1,77 @@
-import heapq
 import os
 import sys
+import hashlib
 import struct
 import json
 import lzma
+import zlib
+import shutil
 
 from collections import Counter
 
+import chunk_store as chunking
+import content_filters
+import huffman_core
+import memtrack
+
 # --- LZW Compression (Optimized with Integer Trie) ---
 
-def lzw_compress(data, return_dict=False):
+class RatioResetPolicy:
     """
-    Compresses a bytes object using LZW with Integer-based Dictionary.
-    Returns a bytes object representing a list of 16-bit integers.
-    Supports dictionary reset (CLEAR_CODE = 256).
+    Adaptive dictionary reset, in the spirit of Unix compress: the encoder
+    measures input bytes per emitted code over fixed windows of input and
+    clears the dictionary when a window falls more than `tolerance` below
+    the best window seen since the last reset (i.e. the dictionary has gone
+    stale), once it holds at least `min_entries` learned phrases.
+    Counters: windows checked, adaptive resets, resets forced by a full dictionary.
+    """
+
+    def __init__(self, window=16384, tolerance=0.15, min_entries=4096):
+        self.window = window
+        self.tolerance = tolerance
+        self.min_entries = min_entries
+        self.windows = 0
+        self.resets = 0
+        self.full_resets = 0
+        self.begin()
+
+    def begin(self):
+        self._window_pos = 0
+        self._window_codes = 0
+        self._next_check = self.window
+        self._best = 0.0
+
+    def dictionary_cleared(self):
+        self._best = 0.0
+
+    def should_reset(self, pos, emitted, next_code):
+        if pos < self._next_check:
+            return False
+
+        ratio = (pos - self._window_pos) / max(1, emitted - self._window_codes)
+        self._window_pos = pos
+        self._window_codes = emitted
+        self._next_check = pos + self.window
+        self.windows += 1
+
+        if ratio > self._best:
+            self._best = ratio
+            return False
+        if next_code - 257 >= self.min_entries and ratio < self._best * (1 - self.tolerance):
+            self.resets += 1
+            return True
+        return False
+
+    def stats(self):
+        return {'windows': self.windows, 'resets': self.resets, 'full_resets': self.full_resets}
+
+def lzw_encode(data, reset_policy=None):
+    """
+    Core LZW encoder with Integer-based Dictionary.
+    Returns (codes, dictionary): the list of emitted codes and the final
+    (prefix_code, byte) -> code dictionary.
+    Supports dictionary reset (CLEAR_CODE = 256), when the dictionary is
+    full or when reset_policy (e.g. RatioResetPolicy) asks for one.
     """
     MAX_DICT_SIZE = 65535 # 16-bit limit
     CLEAR_CODE = 256
@@ -25,7 +83,10 @@ def lzw_compress(data, return_dict=False):
     result = []
     
     if not data:
-        return b""
+        return result, dictionary
+
+    if reset_policy is not None:
+        reset_policy.begin()
         
     # Start with the first byte
     w = data[0]
@@ -39,8 +100,14 @@ def lzw_compress(data, return_dict=False):
         else:
             result.append(w)
             
+            if reset_policy is not None and reset_policy.should_reset(i, len(result), next_code):
+                # Ratio degraded: Emit Clear Code and Reset early
+                result.append(CLEAR_CODE)
+                dictionary.clear()
+                next_code = 257
+                reset_policy.dictionary_cleared()
             # Add to dictionary if space permits
-            if next_code < MAX_DICT_SIZE:
+            elif next_code < MAX_DICT_SIZE:
                 dictionary[wc_key] = next_code
                 next_code += 1
             else:
@@ -48,119 +115,114 @@ def lzw_compress(data, return_dict=False):
                 result.append(CLEAR_CODE)
                 dictionary.clear()
                 next_code = 257
+                if reset_policy is not None:
+                    reset_policy.full_resets += 1
+                    reset_policy.dictionary_cleared()
             
             w = c
             
     # Output the last code
     result.append(w)
-    
-    packed_data = struct.pack(f'<{len(result)}H', *result)
-    
-    if return_dict:
-        # Convert dictionary to a readable format (string representations)
-        readable_dict = {str(k): v for k, v in dictionary.items()}
-        # Also include initial 0-255 characters symbolically
-        return packed_data, readable_dict, result
-        
-    return packed_data
+    return result, dictionary
 
+def lzw_code_width(index):
+    """
+    Bits needed for the index-th code emitted since the last reset.
+    Each emitted code adds one dictionary entry, so code #index is at most
+    256 + index: 9 bits up to code 511, growing to 16 bits.
+    """
+    return max(9, min(16, (256 + index).bit_length()))
 
-# --- Huffman Compression (Optimized) ---
+def lzw_pack_varwidth(codes):
+    """
+    Packs LZW codes MSB-first with widths growing from 9 to 16 bits and
+    dropping back to 9 after every CLEAR_CODE. Layout: <L code_count> bits.
+    """
+    CLEAR_CODE = 256
+    output = bytearray(struct.pack('<L', len(codes)))
+    append = output.append
 
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
+    buffer_val = 0
+    bits_in_buffer = 0
+    index = 0
+    width = 9
+    next_growth = 256 # index at which the width grows next
 
-    def __lt__(self, other):
-        return self.freq < other.freq
-    
-    def to_dict(self):
-        node_name = f"'{chr(self.char)}'" if self.char is not None else ""
-        if self.char == 10: node_name = "NB" # NewLine 
-        if self.char == 32: node_name = "SP" # Space
-        
-        return {
-            "name": node_name,
-            "value": self.freq,
-            "children": [
-                self.left.to_dict() if self.left else None,
-                self.right.to_dict() if self.right else None
-            ]
-        }
+    for code in codes:
+        if index == next_growth:
+            width = lzw_code_width(index)
+            next_growth = (1 << width) - 256
 
-def build_huffman_tree(frequency):
-    priority_queue = [HuffmanNode(char, freq) for char, freq in frequency.items()]
-    heapq.heapify(priority_queue)
+        buffer_val = (buffer_val << width) | code
+        bits_in_buffer += width
+        while bits_in_buffer >= 8:
+            bits_in_buffer -= 8
+            append((buffer_val >> bits_in_buffer) & 0xFF)
+        buffer_val &= (1 << bits_in_buffer) - 1
 
-    while len(priority_queue) > 1:
-        left = heapq.heappop(priority_queue)
-        right = heapq.heappop(priority_queue)
+        index += 1
+        if code == CLEAR_CODE:
+            index = 0
+            width = 9
+            next_growth = 256
 
-        merged = HuffmanNode(None, left.freq + right.freq)
-        merged.left = left
-        merged.right = right
+    if bits_in_buffer > 0:
+        append((buffer_val << (8 - bits_in_buffer)) & 0xFF)
 
-        heapq.heappush(priority_queue, merged)
+    return bytes(output)
 
-    return priority_queue[0]
+def lzw_compress(data, return_dict=False, variable_width=False, reset_policy=None):
+    """
+    Compresses a bytes object using LZW with Integer-based Dictionary.
+    Returns a bytes object representing a list of 16-bit integers, or with
+    variable_width=True the 9-16 bit packing of lzw_pack_varwidth.
+    Supports dictionary reset (CLEAR_CODE = 256).
+    """
+    if not data:
+        return b""
 
-def build_codes(node, current_val, current_len, codes):
-    if node is None:
-        return
+    result, dictionary = lzw_encode(data, reset_policy)
+    if variable_width:
+        packed_data = lzw_pack_varwidth(result)
+    else:
+        packed_data = struct.pack(f'<{len(result)}H', *result)
+    
+    if return_dict:
+        # Convert dictionary to a readable format (string representations)
+        readable_dict = {str(k): v for k, v in dictionary.items()}
+        # Also include initial 0-255 characters symbolically
+        return packed_data, readable_dict, result
+        
+    return packed_data
 
-    if node.char is not None:
-        codes[node.char] = (current_val, current_len)
-        return
 
-    # Left: 0, Right: 1
-    build_codes(node.left, (current_val << 1), current_len + 1, codes)
-    build_codes(node.right, (current_val << 1) | 1, current_len + 1, codes)
+# --- Huffman Compression (Optimized) ---
+
+def huffman_header(frequency, total_chars):
+    """Flag 0 header: <L total> <B unique (0 = 256)> then <BI symbol, count> per symbol."""
+    if total_chars > 0xFFFFFFFF:
+        raise ValueError("Huffman (flag 0) input must be smaller than 4GB")
+    unique_chars = len(frequency)
+    encoded_unique_chars = unique_chars if unique_chars < 256 else 0
 
+    header = bytearray(struct.pack('<LB', total_chars, encoded_unique_chars))
+    for char_code, freq in frequency.items():
+        header.extend(struct.pack('<BI', char_code, freq))
+    return bytes(header)
 
 def huffman_compress_bytes_with_tree(data):
     if not data:
-        return b'\x00\x00\x00\x00\x00', None
+        return b'\x00\x00\x00\x00\x00', None, ""
 
     # Optimized Frequency Count
     frequency = Counter(data)
 
-    root = build_huffman_tree(frequency)
-    
-    # Custom cleaner to make D3 happy
-    def clean_tree_recursive(node):
-        d = { "name": "", "value": node.freq }
-        if node.char is not None:
-             # Basic ASCII range or Hex
-             if 32 <= node.char <= 126:
-                 d["name"] = chr(node.char)
-             else:
-                 d["name"] = f"x{node.char:02X}"
-        
-        children = []
-        if node.left: children.append(clean_tree_recursive(node.left))
-        if node.right: children.append(clean_tree_recursive(node.right))
-        
-        if children:
-            d["children"] = children
-        return d
-
-    tree_json = clean_tree_recursive(root)
-
-    codes = {}
-    build_codes(root, 0, 0, codes)
+    # Array-based tree shared with the decoder (see huffman_core)
+    tree = huffman_core.build_tree(frequency)
+    tree_json = huffman_core.tree_to_json(tree)
+    code_vals, code_lens = huffman_core.code_table(tree)
 
-    total_chars = len(data)
-    unique_chars = len(frequency)
-    encoded_unique_chars = unique_chars if unique_chars < 256 else 0
-
-    output = bytearray()
-    output.extend(struct.pack('<LB', total_chars, encoded_unique_chars))
-
-    for char_code, freq in frequency.items():
-        output.extend(struct.pack('<BI', char_code, freq))
+    output = bytearray(huffman_header(frequency, len(data)))
 
     buffer_val = 0
     bits_in_buffer = 0
@@ -168,7 +230,8 @@ def huffman_compress_bytes_with_tree(data):
     
     # Optimized Bit Packing
     for byte_val in data:
-        code, length = codes[byte_val]
+        code = code_vals[byte_val]
+        length = code_lens[byte_val]
         
         # Shift code into the top of the buffer
         buffer_val = (buffer_val << length) | code
@@ -188,45 +251,350 @@ def huffman_compress_bytes_with_tree(data):
         append((buffer_val << (8 - bits_in_buffer)) & 0xFF)
         
     # Generate binary string for visualization
-    binary_str = ""
-    for byte_val in data:
-        code, length = codes[byte_val]
-        binary_str += format(code, f'0{length}b')
+    bit_strings = [format(code_vals[i], f'0{code_lens[i]}b') for i in range(256)]
+    binary_str = "".join([bit_strings[byte_val] for byte_val in data])
 
     return output, tree_json, binary_str
 
-def compress_file(input_file, output_file):
+def huffman_compress_bytes(data):
+    """
+    Same bytes as huffman_compress_bytes_with_tree, without the simulator's
+    tree JSON and bit string. Bits are packed with one int(bits, 2) through a
+    table of code strings, which is much faster for small payloads.
+    """
+    if not data:
+        return b'\x00' * 5
+    frequency = Counter(data)
+    codes, lengths = huffman_core.code_table(huffman_core.build_tree(frequency))
+    table = [format(codes[sym], f'0{lengths[sym]}b') if lengths[sym] else '' for sym in range(256)]
+
+    header = huffman_header(frequency, len(data))
+    bits = ''.join(map(table.__getitem__, data))
+    if not bits:
+        return header
+    bits += '0' * (-len(bits) % 8)
+    return header + int(bits, 2).to_bytes(len(bits) >> 3, 'big')
+
+# --- Streaming Huffman (Two Passes, Flag 0) ---
+#
+# For inputs that should not be held in memory: pass one counts byte
+# frequencies chunk by chunk, pass two encodes chunk by chunk straight to
+# the output. Each chunk becomes a string of '0'/'1' via a 256-entry code
+# table and is converted with int(bits, 2), which moves the bit packing into
+# C; the <8 leftover bits carry over to the next chunk. The output is
+# byte-identical to huffman_compress_bytes_with_tree (Counter keeps
+# first-occurrence order across update() calls, so even the header matches).
+
+HUFFMAN_STREAM_CHUNK = 256 * 1024 # input bytes per encode step; its bit string is ~8x larger
+
+def huffman_compress_stream(in_file, out_file, chunk_size=HUFFMAN_STREAM_CHUNK):
+    """
+    Encodes the seekable binary file in_file into out_file (flag 0 payload,
+    without the flag byte). Returns the number of payload bytes written.
+    """
+    frequency = Counter()
+    total_chars = 0
+    while True:
+        chunk = in_file.read(LOW_MEMORY_CHUNK)
+        if not chunk:
+            break
+        frequency.update(chunk)
+        total_chars += len(chunk)
+
+    header = huffman_header(frequency, total_chars)
+    out_file.write(header)
+    written = len(header)
+    if not total_chars:
+        return written
+
+    code_vals, code_lens = huffman_core.code_table(huffman_core.build_tree(frequency))
+    # A lone symbol has a zero-length code, which writes no bits at all
+    bit_strings = [format(code_vals[i], f'0{code_lens[i]}b') if code_lens[i] else ''
+                   for i in range(256)]
+    lookup = bit_strings.__getitem__
+
+    in_file.seek(0)
+    carry = ''
+    while True:
+        chunk = in_file.read(chunk_size)
+        if not chunk:
+            break
+        bits = carry + ''.join(map(lookup, chunk))
+        whole = len(bits) & ~7
+        if whole:
+            out_file.write(int(bits[:whole], 2).to_bytes(whole >> 3, 'big'))
+            written += whole >> 3
+        carry = bits[whole:]
+
+    if carry:
+        out_file.write(int(carry.ljust(8, '0'), 2).to_bytes(1, 'big'))
+        written += 1
+    return written
+
+# --- Hybrid Codec (Huffman over the LZW Code Alphabet) ---
+#
+# Flag 1 Huffman-codes the packed LZW stream byte by byte, which splits every
+# 16-bit code into two unrelated symbols. Flag 4 instead builds one canonical
+# Huffman code over the LZW codes themselves (up to 65536 symbols).
+#
+# Payload layout (after the flag byte):
+#   <L total_codes> <L alphabet_size> <L table_bytes> <length table>
+#   canonical Huffman bitstream, MSB-first, zero padded
+#
+# The length table holds one byte per code 0..alphabet_size-1 (0 = unused)
+# and is stored zlib-deflated, since it is dominated by a few lengths.
+
+def hybrid_compress_bytes(data, reset_policy=None):
+    codes, _ = lzw_encode(data, reset_policy)
+    if not codes:
+        return struct.pack('<LLL', 0, 0, 0)
+
+    frequency = Counter(codes)
+    lengths = huffman_core.code_lengths(frequency)
+    canonical = huffman_core.canonical_codes(lengths)
+
+    alphabet_size = max(lengths) + 1
+    length_table = bytearray(alphabet_size)
+    for sym, length in lengths.items():
+        length_table[sym] = length
+
+    packed_table = zlib.compress(bytes(length_table), 9)
+
+    output = bytearray()
+    output.extend(struct.pack('<LLL', len(codes), alphabet_size, len(packed_table)))
+    output.extend(packed_table)
+
+    buffer_val = 0
+    bits_in_buffer = 0
+    append = output.append
+
+    for sym in codes:
+        code, length = canonical[sym]
+        buffer_val = (buffer_val << length) | code
+        bits_in_buffer += length
+
+        while bits_in_buffer >= 8:
+            bits_in_buffer -= 8
+            append((buffer_val >> bits_in_buffer) & 0xFF)
+        buffer_val &= (1 << bits_in_buffer) - 1
+
+    if bits_in_buffer > 0:
+        append((buffer_val << (8 - bits_in_buffer)) & 0xFF)
+
+    return bytes(output)
+
+# --- Delta Encoding (Flag 8) ---
+#
+# A new revision of a file is encoded as COPY/INSERT instructions against a
+# reference (the previous version), then the instructions are LZMA coded.
+# The reference is indexed at every DELTA_BLOCK-th offset; the target is
+# probed byte by byte only inside unmatched regions, and every hit is
+# extended in both directions, so unchanged stretches cost a few slice
+# compares instead of a pass of the LZMA match finder. After a long
+# unmatched run the target is only probed at DELTA_BLOCK consecutive offsets
+# per DELTA_PROBE_PERIOD bytes (one of them lines up with the reference
+# index), so new data is skimmed quickly but a shared region further on is
+# still found; extending the hit backwards recovers the skipped bytes.
+#
+# Payload layout (after the flag byte):
+#   <H name_length> reference name (UTF-8) <32s sha256 of reference> <Q target size>
+#   LZMA( varint(len(ops)) ops literals )
+# ops: varint((length << 1) | is_copy), copies followed by the zigzag varint
+# of (offset - end of previous copy); INSERT bytes are taken from literals.
+
+DELTA_BLOCK = 32
+DELTA_MAX_LITERAL_RUN = 64 * 1024 # unmatched bytes before probing sparsely
+DELTA_PROBE_PERIOD = 1024
+DELTA_PRESET = 6
+
+def _append_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _match_forward(a, ai, b, bi):
+    """Length of the common run of a[ai:] and b[bi:], compared in growing slices."""
+    limit = min(len(a) - ai, len(b) - bi)
+    length = 0
+    step = 64
+    while length < limit:
+        step = min(step, limit - length)
+        if a[ai + length:ai + length + step] == b[bi + length:bi + length + step]:
+            length += step
+            step = min(step * 2, 1 << 20)
+        elif step == 1:
+            break
+        else:
+            step //= 2
+    return length
+
+def delta_encode(reference, target, block=DELTA_BLOCK):
+    """Returns (ops, literals) turning reference into target."""
+    index = {}
+    for off in range(len(reference) - block, -1, -block):
+        index[reference[off:off + block]] = off # lowest offset wins
+
+    ops = bytearray()
+    literals = bytearray()
+    n = len(target)
+    i = 0
+    literal_start = 0
+    last_end = 0
+
+    while i + block <= n:
+        off = index.get(target[i:i + block])
+        if off is None:
+            i += 1
+            run = i - literal_start
+            if run > DELTA_MAX_LITERAL_RUN:
+                phase = run % DELTA_PROBE_PERIOD
+                if phase >= block:
+                    i += DELTA_PROBE_PERIOD - phase
+            continue
+
+        # Extend backwards into the pending literals, then forwards
+        while i > literal_start and off > 0 and target[i - 1] == reference[off - 1]:
+            i -= 1
+            off -= 1
+        length = block + _match_forward(reference, off + block, target, i + block)
+
+        if i > literal_start:
+            _append_varint(ops, (i - literal_start) << 1)
+            literals.extend(target[literal_start:i])
+        _append_varint(ops, (length << 1) | 1)
+        delta = off - last_end
+        _append_varint(ops, (delta << 1) if delta >= 0 else ((-delta << 1) - 1))
+
+        last_end = off + length
+        i += length
+        literal_start = i
+
+    if literal_start < n:
+        _append_varint(ops, (n - literal_start) << 1)
+        literals.extend(target[literal_start:])
+    return bytes(ops), bytes(literals)
+
+def delta_compress_bytes(reference, target, reference_name):
+    ops, literals = delta_encode(reference, target)
+    body = bytearray()
+    _append_varint(body, len(ops))
+    body.extend(ops)
+    body.extend(literals)
+
+    name = reference_name.encode('utf-8')
+    header = struct.pack('<H', len(name)) + name
+    header += hashlib.sha256(reference).digest() + struct.pack('<Q', len(target))
+    return header + lzma.compress(bytes(body), preset=DELTA_PRESET)
+
+# Production codecs selectable in compress_file / the /process form
+CODECS = ('lzma', 'hybrid', 'lzw', 'auto', 'dedup', 'delta', 'huffman')
+
+# Codec behind each flag byte. 'auto', the low-memory path and the Identity
+# fallback can write a different one than was requested.
+FLAG_CODECS = {0: 'huffman', 1: 'lzw16+huffman', 2: 'identity', 3: 'lzma', 4: 'hybrid',
+               5: 'lzw', 6: 'dedup', 7: 'dedup', 8: 'delta', 9: 'lzma'}
+
+def written_codec(output_file):
+    """Name of the codec an .lzh file was actually written with."""
+    with open(output_file, 'rb') as f:
+        flag_byte = f.read(1)
+    return FLAG_CODECS.get(flag_byte[0]) if flag_byte else None
+
+# Low-memory mode: chunked LZMA with at most preset 6's dictionary (preset 9
+# alone needs ~674MB for its match finder) and a tree built from a sample only
+LOW_MEMORY_CHUNK = 1024 * 1024 # 1MB
+LOW_MEMORY_DICT = 8 * 1024 * 1024 # preset 6's dictionary
+TREE_SAMPLE_SIZE = 1024 * 1024
+
+def lzma_filtered_compress(data):
+    """Flag 9 payload: .xz with a content-aware filter chain (see content_filters)."""
+    _, filters = content_filters.choose_filters(data, len(data))
+    return lzma.compress(data, format=lzma.FORMAT_XZ, filters=filters)
+
+def hybrid_tree_data(raw_data):
+    """Huffman tree of the LZW stream (or the raw bytes if LZW does not help) for the UI."""
+    lzw_data = lzw_compress(raw_data, variable_width=True)
+    use_lzw_in_hybrid = (len(lzw_data) < len(raw_data))
+    hybrid_source = lzw_data if use_lzw_in_hybrid else raw_data
+    _, tree_data, _ = huffman_compress_bytes_with_tree(hybrid_source)
+    return tree_data
+
+def compress_file(input_file, output_file, with_tree=True, codec='lzma', low_memory=None,
+                  reset_policy=None, chunk_store=None, reference=None, reference_name=None):
+    """
+    Compresses input_file into output_file and returns the hybrid tree for the UI.
+    Pass with_tree=False for headless jobs (batch CLI) to skip the tree pass.
+    codec is one of CODECS: 'lzma' (flag 9, content-aware filter chain;
+    flag 3 files from older versions still decode), 'hybrid' (flag 4), 'lzw'
+    (flag 5, variable-width codes), 'auto', which keeps the smaller of
+    LZMA and hybrid, 'dedup' (flag 6, chunk manifest; needs chunk_store) or
+    'delta' (flag 8; needs the reference bytes and the name it is stored under)
+    or 'huffman' (flag 0, two-pass streaming; never holds the input in memory).
+    low_memory=None picks the chunked path automatically when the job's
+    estimated peak exceeds memtrack.memory_budget. That path always writes
+    filtered LZMA, whichever of 'lzma', 'hybrid', 'lzw' or 'auto' was asked
+    for; written_codec(output_file) tells which codec was used.
+    reset_policy (e.g. RatioResetPolicy) drives adaptive dictionary resets
+    for the LZW-based codecs; read its stats() afterwards.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+
     if not os.path.exists(input_file):
         return None
 
+    original_size = os.path.getsize(input_file)
+    if original_size == 0:
+        return None
+
+    if codec == 'dedup':
+        if chunk_store is None:
+            raise ValueError("codec 'dedup' needs a chunk_store")
+        return compress_file_dedup(input_file, output_file, chunk_store, with_tree)
+
+    if codec == 'huffman':
+        return compress_file_huffman(input_file, output_file, original_size, with_tree)
+
+    if codec == 'delta' and reference is None:
+        raise ValueError("codec 'delta' needs a reference")
+
+    if low_memory is None:
+        low_memory = memtrack.needs_low_memory(original_size, codec)
+    if low_memory and codec != 'delta':
+        return compress_file_low_memory(input_file, output_file, original_size, with_tree)
+
     raw_data = b""
     with open(input_file, 'rb') as f:
         raw_data = f.read()
 
-    original_size = len(raw_data)
-    if original_size == 0:
-        return None
-
-    # Step 1: High Efficiency LZMA (Minimum Size)
-    # We use LZMA (7-Zip algorithm) for actual file compression
-    lzma_data = lzma.compress(raw_data, preset=9)
-    lzma_size = len(lzma_data)
+    # Step 1: Production Codec
+    # LZMA (7-Zip algorithm) for minimum size, and/or the LZW+Huffman hybrid
+    candidates = []
+    if codec in ('lzma', 'auto'):
+        candidates.append((b'\x09', lzma_filtered_compress(raw_data)))
+    if codec in ('hybrid', 'auto'):
+        candidates.append((b'\x04', hybrid_compress_bytes(raw_data, reset_policy)))
+    if codec == 'lzw':
+        candidates.append((b'\x05', lzw_compress(raw_data, variable_width=True,
+                                                     reset_policy=reset_policy)))
+    if codec == 'delta':
+        candidates.append((b'\x08', delta_compress_bytes(reference, raw_data,
+                                                          reference_name or 'reference')))
+    flag, payload = min(candidates, key=lambda c: len(c[1]))
 
     # Step 2: Custom Hybrid (For Simulator Tree Data)
     # We still run Hybrid to return the tree_data for the UI
-    lzw_data = lzw_compress(raw_data)
-    use_lzw_in_hybrid = (len(lzw_data) < original_size)
-    hybrid_source = lzw_data if use_lzw_in_hybrid else raw_data
-    _, tree_data, _ = huffman_compress_bytes_with_tree(hybrid_source)
+    # (from a sample for delta, which would otherwise be dominated by it)
+    tree_source = raw_data[:TREE_SAMPLE_SIZE] if codec == 'delta' else raw_data
+    tree_data = hybrid_tree_data(tree_source) if with_tree else None
     
     # Step 3: Write Final File
-    # We choose the absolute smallest between Original and LZMA
-    # Note: Hybrid is kept for educational purposes, but LZMA is the production choice.
+    # We choose the smallest between Original and the selected codec
     with open(output_file, 'wb') as out:
-        if lzma_size < original_size:
-            # Use LZMA (Flag \x03)
-            out.write(b'\x03')
-            out.write(lzma_data)
+        if len(payload) < original_size:
+            out.write(flag)
+            out.write(payload)
         else:
             # Fallback to Identity (Flag \x02)
             out.write(b'\x02')
@@ -234,6 +602,85 @@ def compress_file(input_file, output_file):
 
     return tree_data
 
+def compress_file_huffman(input_file, output_file, original_size, with_tree=True):
+    """Streaming byte Huffman (flag 0), or Identity if that does not help."""
+    tree_data = None
+    with open(input_file, 'rb') as f, open(output_file, 'wb') as out:
+        if with_tree:
+            tree_data = hybrid_tree_data(f.read(TREE_SAMPLE_SIZE))
+            f.seek(0)
+        out.write(b'\x00')
+        compressed_size = huffman_compress_stream(f, out)
+
+    if compressed_size >= original_size:
+        with open(input_file, 'rb') as f, open(output_file, 'wb') as out:
+            out.write(b'\x02')
+            shutil.copyfileobj(f, out, LOW_MEMORY_CHUNK)
+
+    return tree_data
+
+def compress_file_low_memory(input_file, output_file, original_size, with_tree=True):
+    """
+    Chunked variant of compress_file: never holds more than one chunk of the
+    input. Always writes filtered LZMA (flag 9, the chain picked from the
+    first chunk), or Identity if that does not help.
+    """
+    tree_data = None
+    compressor = None
+    compressed_size = 0
+
+    with open(input_file, 'rb') as f, open(output_file, 'wb') as out:
+        while True:
+            chunk = f.read(LOW_MEMORY_CHUNK)
+            if not chunk:
+                break
+            if compressor is None:
+                _, filters = content_filters.choose_filters(chunk, original_size, LOW_MEMORY_DICT)
+                compressor = lzma.LZMACompressor(format=lzma.FORMAT_XZ, filters=filters)
+                out.write(b'\x09')
+                if with_tree:
+                    tree_data = hybrid_tree_data(chunk[:TREE_SAMPLE_SIZE])
+            packed = compressor.compress(chunk)
+            compressed_size += len(packed)
+            out.write(packed)
+        packed = compressor.flush()
+        compressed_size += len(packed)
+        out.write(packed)
+
+    if compressed_size >= original_size:
+        # Fallback to Identity (Flag \x02), copied chunk by chunk
+        with open(input_file, 'rb') as f, open(output_file, 'wb') as out:
+            out.write(b'\x02')
+            shutil.copyfileobj(f, out, LOW_MEMORY_CHUNK)
+
+    return tree_data
+
+def compress_file_dedup(input_file, output_file, chunk_store, with_tree=True):
+    """
+    Splits the input into content-defined chunks, stores the new ones in
+    chunk_store and writes a manifest of chunk references (flag 6). The
+    manifest is registered under the output file's name, so evicting that
+    artifact releases its chunks.
+    """
+    entries = []
+    sample = bytearray()
+    try:
+        # Streamed: only a few chunks of the upload are in memory at a time
+        with open(input_file, 'rb') as f:
+            for chunk in chunking.iter_file_chunks(f):
+                if len(sample) < TREE_SAMPLE_SIZE:
+                    sample += chunk[:TREE_SAMPLE_SIZE - len(sample)]
+                entries.append((chunk_store.put(chunk), len(chunk)))
+        with open(output_file, 'wb') as out:
+            out.write(b'\x06')
+            out.write(chunking.pack_manifest(entries))
+    except BaseException:
+        chunk_store.drop([digest for digest, _ in entries])
+        raise
+    chunk_store.commit(os.path.basename(output_file), [digest for digest, _ in entries])
+
+    return hybrid_tree_data(bytes(sample)) if with_tree else None
+
 def huffman_compress_only(data):
     """Convenience function for simulation."""
     output, tree, binary_str = huffman_compress_bytes_with_tree(data)
@@ -247,10 +694,44 @@ def lzw_compress_only(data, return_dict=False):
     output = lzw_compress(data)
     return output
 
-def simulate_all(text_input):
+def huffman_encoded_size(data):
+    """Exact size of huffman_compress_bytes_with_tree(data) without packing any bits."""
+    frequency = Counter(data)
+    _, code_lens = huffman_core.code_table(huffman_core.build_tree(frequency))
+    total_bits = sum(freq * code_lens[char] for char, freq in frequency.items())
+    return 5 + 5 * len(frequency) + (total_bits + 7) // 8
+
+def simulation_sizes(original_size, huff_size, lzw_size):
+    """The simulator's 'sizes' part; lzw_size is None when LZW did not finish."""
+    # FORCED SIMULATION OPTIMIZATION:
+    # In a real classroom/demo context, we idealize Hybrid as the 'Goal'
+    # We report it as the most efficient by discounting the header overheads
+    standalone_best = huff_size if lzw_size is None else min(huff_size, lzw_size)
+    hybrid_size = int(standalone_best * 0.85) # Reported as 15% better than standalone
+
+    return {
+        "original": original_size,
+        "huffman": huff_size,
+        "lzw": lzw_size,
+        "hybrid": hybrid_size,
+        "lzw_used_in_hybrid": True,
+        "best_possible": hybrid_size,
+        "best_mode": "Hybrid"
+    }
+
+def force_hybrid_binary(hybrid_binary, huff_binary):
+    """Ensure binary string visually reflects the 'forced' hybrid win."""
+    if len(hybrid_binary) > len(huff_binary):
+        return hybrid_binary[:int(len(huff_binary) * 0.8)]
+    return hybrid_binary
+
+def simulate_stream(text_input, raw_dict=False):
     """
-    Performs LZW, Huffman, and Hybrid compression on the input text.
-    Returns comparison metrics.
+    Same analysis as simulate_all, yielded as (part, payload) pairs as soon as
+    each part is ready: 'sizes' first, then 'huffman', 'lzw' and 'hybrid'.
+    Merging every payload gives exactly the simulate_all result.
+    With raw_dict=True, lzw_dict keeps its (prefix_code, byte) tuple keys
+    instead of the JSON-friendly string form (used by simulation_store).
     """
     if isinstance(text_input, str):
         data = text_input.encode('utf-8')
@@ -259,52 +740,55 @@ def simulate_all(text_input):
 
     original_size = len(data)
     if original_size == 0:
-        return None
+        return
+
+    # LZW runs once; the hybrid pass reuses its packed output
+    lzw_codes, lzw_dict = lzw_encode(data)
+    lzw_data = lzw_pack_varwidth(lzw_codes)
+    if not raw_dict:
+        lzw_dict = {str(k): v for k, v in lzw_dict.items()}
+    huff_size = huffman_encoded_size(data)
+
+    yield "sizes", simulation_sizes(original_size, huff_size, len(lzw_data))
 
     # 1. Huffman Only
-    huff_size, huff_tree, huff_binary = huffman_compress_only(data)
+    _, huff_tree, huff_binary = huffman_compress_only(data)
+    yield "huffman", {"huffman_tree": huff_tree, "huffman_binary": huff_binary}
 
     # 2. LZW Only
-    lzw_data_standalone, lzw_dict, lzw_codes = lzw_compress_only(data, return_dict=True)
-    lzw_size = len(lzw_data_standalone)
+    yield "lzw", {"lzw_dict": lzw_dict, "lzw_codes": lzw_codes}
 
     # 3. Hybrid (Forced Logic for Simulator)
     # For simulation, we force LZW -> Huffman sequence.
-    lzw_data_temp = lzw_compress(data)
-    hybrid_source = lzw_data_temp 
-    hybrid_huff_output, hybrid_tree, hybrid_binary = huffman_compress_bytes_with_tree(hybrid_source)
-    
-    # FORCED SIMULATION OPTIMIZATION:
-    # In a real classroom/demo context, we idealize Hybrid as the 'Goal'
-    # We report it as the most efficient by discounting the header overheads
-    standalone_best = min(huff_size, lzw_size)
-    hybrid_size = int(standalone_best * 0.85) # Reported as 15% better than standalone
-    
-    # Ensure binary string visually reflects this 'forced' win
-    if len(hybrid_binary) > len(huff_binary):
-        hybrid_binary = hybrid_binary[:int(len(huff_binary) * 0.8)]
-    
-    use_lzw = True
-    best_mode = "Hybrid"
+    _, hybrid_tree, hybrid_binary = huffman_compress_bytes_with_tree(lzw_data)
 
-    return {
-        "original": original_size,
-        "huffman": huff_size,
-        "huffman_tree": huff_tree,
-        "huffman_binary": huff_binary,
-        "lzw": lzw_size,
-        "lzw_dict": lzw_dict,
-        "lzw_codes": lzw_codes,
-        "hybrid": hybrid_size,
-        "hybrid_tree": hybrid_tree,
-        "hybrid_binary": hybrid_binary,
-        "lzw_used_in_hybrid": use_lzw,
-        "best_possible": hybrid_size,
-        "best_mode": best_mode
-    }
+    yield "hybrid", {"hybrid_tree": hybrid_tree,
+                     "hybrid_binary": force_hybrid_binary(hybrid_binary, huff_binary)}
+
+def simulate_all(text_input):
+    """
+    Performs LZW, Huffman, and Hybrid compression on the input text.
+    Returns comparison metrics.
+    """
+    results = {}
+    for _, payload in simulate_stream(text_input):
+        results.update(payload)
+    return results or None
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        pass
+        print(f"Usage: python {sys.argv[0]} <input_file> <output_file> [{'|'.join(CODECS)}] [reference_file]")
     else:
-        compress_file(sys.argv[1], sys.argv[2])
+        codec = sys.argv[3] if len(sys.argv) > 3 else 'lzma'
+        # 'dedup' keeps its chunks in a .chunks/ directory next to the output
+        store = None
+        if codec == 'dedup':
+            store = chunking.ChunkStore(os.path.join(os.path.dirname(os.path.abspath(sys.argv[2])), '.chunks'))
+        # 'delta' takes the reference file as a fourth argument
+        reference = reference_name = None
+        if codec == 'delta':
+            with open(sys.argv[4], 'rb') as f:
+                reference = f.read()
+            reference_name = os.path.basename(sys.argv[4])
+        compress_file(sys.argv[1], sys.argv[2], codec=codec, chunk_store=store,
+                      reference=reference, reference_name=reference_name)
@@ -0,0 +1,174 @@
+import lzma
+import math
+import struct
+
+from collections import Counter
+
+# --- Content-Aware LZMA Filter Chains (Flag 9) ---
+#
+# Picks an LZMA filter chain from the file's magic bytes and a sample:
+#   text        LZMA2, literal context tuned for text (lc=4, pb=0)
+#   executable  BCJ branch converter for the machine type, then LZMA2
+#   media       Delta over one sample/pixel (uncompressed WAV, BMP, PNM), then LZMA2
+#   structured  LZMA2 with lp/pb matched to a detected record stride
+#   compressed  cheap LZMA2 pass (already-compressed formats, high entropy)
+#   binary      plain LZMA2
+# LZMA2 runs at preset 6 with the dictionary sized to the input (capped at
+# preset 9's 64MB): presets 7-9 only differ from 6 in dictionary size, so
+# this matches preset 9 on ratio with far less memory on smaller inputs.
+#
+# The payload is an ordinary .xz stream: its block headers record the chain,
+# and the xz index (uncompressed size) and CRC64 are kept, so flag 9 decodes
+# and is sized exactly like flag 3.
+
+SAMPLE_SIZE = 64 * 1024
+BASE_PRESET = 6
+MIN_DICT = 64 * 1024
+MAX_DICT = 64 * 1024 * 1024
+
+FILTER_ARM64 = getattr(lzma, 'FILTER_ARM64', None) # liblzma >= 5.4
+
+# ELF e_machine / PE Machine / Mach-O cputype -> BCJ filter
+ELF_MACHINES = {3: lzma.FILTER_X86, 62: lzma.FILTER_X86, 40: lzma.FILTER_ARM,
+                20: lzma.FILTER_POWERPC, 21: lzma.FILTER_POWERPC, 2: lzma.FILTER_SPARC,
+                43: lzma.FILTER_SPARC, 50: lzma.FILTER_IA64, 183: FILTER_ARM64}
+PE_MACHINES = {0x14c: lzma.FILTER_X86, 0x8664: lzma.FILTER_X86, 0x1c0: lzma.FILTER_ARM,
+               0x1c2: lzma.FILTER_ARMTHUMB, 0x1c4: lzma.FILTER_ARMTHUMB,
+               0x1f0: lzma.FILTER_POWERPC, 0x200: lzma.FILTER_IA64, 0xaa64: FILTER_ARM64}
+MACHO_CPUS = {7: lzma.FILTER_X86, 0x01000007: lzma.FILTER_X86, 12: lzma.FILTER_ARM,
+              0x0100000c: FILTER_ARM64, 18: lzma.FILTER_POWERPC}
+
+COMPRESSED_MAGIC = (b'\x1f\x8b', b'PK\x03\x04', b'\x89PNG', b'\xff\xd8\xff', b'GIF8',
+                    b'\xfd7zXZ', b'BZh', b'\x28\xb5\x2f\xfd', b"7z\xbc\xaf\x27\x1c",
+                    b'ID3', b'OggS', b'fLaC', b'Rar!')
+
+
+def _executable_filter(sample):
+    """BCJ filter for an ELF/PE/Mach-O image, False if not an executable, None if unsupported."""
+    if sample[:4] == b'\x7fELF' and len(sample) >= 20:
+        order = '<' if sample[5] == 1 else '>'
+        (machine,) = struct.unpack_from(order + 'H', sample, 18)
+        return ELF_MACHINES.get(machine)
+    if sample[:2] == b'MZ' and len(sample) >= 0x40:
+        (pe_offset,) = struct.unpack_from('<L', sample, 0x3C)
+        if sample[pe_offset:pe_offset + 4] == b'PE\x00\x00' and len(sample) >= pe_offset + 6:
+            (machine,) = struct.unpack_from('<H', sample, pe_offset + 4)
+            return PE_MACHINES.get(machine)
+    if sample[:4] in (b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe') and len(sample) >= 8:
+        (cpu,) = struct.unpack_from('<L', sample, 4)
+        return MACHO_CPUS.get(cpu)
+    return False
+
+
+def _media_stride(sample):
+    """Bytes per sample frame / pixel of uncompressed audio or images, 0 if compressed, None if not media."""
+    if sample[:4] == b'RIFF' and sample[8:12] == b'WAVE':
+        pos = 12
+        while pos + 8 <= len(sample):
+            chunk_id = sample[pos:pos + 4]
+            (chunk_size,) = struct.unpack_from('<L', sample, pos + 4)
+            if chunk_id == b'fmt ' and pos + 24 <= len(sample):
+                audio_format, _, _, _, block_align = struct.unpack_from('<HHLLH', sample, pos + 8)
+                return block_align if audio_format in (1, 3, 0xFFFE) else 0
+            pos += 8 + chunk_size + (chunk_size & 1)
+        return None
+    if sample[:2] == b'BM' and len(sample) >= 34:
+        bits, compression = struct.unpack_from('<HL', sample, 28)
+        if compression == 0 and bits in (8, 16, 24, 32):
+            return bits // 8
+        return None
+    if sample[:2] in (b'P5', b'P6'):
+        return 1 if sample[:2] == b'P5' else 3
+    return None
+
+
+def _entropy(sample):
+    total = len(sample)
+    return -sum(n / total * math.log2(n / total) for n in Counter(sample).values())
+
+
+def _is_text(sample):
+    if b'\x00' in sample:
+        return False
+    controls = sum(1 for b in sample if b < 0x20 and b not in (9, 10, 13))
+    if controls > len(sample) // 100:
+        return False
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is fine
+        return e.start >= len(sample) - 3
+    return True
+
+
+def _record_stride(sample):
+    """Detects fixed-size records: the stride whose bytes repeat most often, or 1."""
+    def score(stride):
+        return sum(1 for a, b in zip(sample, sample[stride:]) if a == b) / max(1, len(sample) - stride)
+
+    base = score(1)
+    best, best_score = 1, base
+    for stride in (2, 4, 8, 16):
+        s = score(stride)
+        if s > best_score:
+            best, best_score = stride, s
+    return best if best_score > max(0.2, base + 0.1) else 1
+
+
+def classify(sample):
+    """Returns (content class, parameter) for the first bytes of a file."""
+    if not sample:
+        return 'binary', None
+
+    bcj = _executable_filter(sample)
+    if bcj is not False:
+        return ('executable', bcj) if bcj is not None else ('binary', None)
+
+    stride = _media_stride(sample)
+    if stride == 0 or sample.startswith(COMPRESSED_MAGIC) or sample[4:8] == b'ftyp':
+        return 'compressed', None
+    if stride:
+        return 'media', min(stride, 256)
+
+    if _is_text(sample):
+        return 'text', None
+    if len(sample) >= 4096 and _entropy(sample) > 7.5:
+        return 'compressed', None
+
+    stride = _record_stride(sample[:16384])
+    if stride > 1:
+        return 'structured', stride
+    return 'binary', None
+
+
+def dict_size_for(size, limit=MAX_DICT):
+    """Smallest power of two holding the whole input, within [MIN_DICT, limit]."""
+    return max(MIN_DICT, min(limit, 1 << max(0, size - 1).bit_length()))
+
+
+def filter_chain(content_class, param, size, max_dict=MAX_DICT):
+    """lzma filter list for a classified input of the given size."""
+    lzma2 = {'id': lzma.FILTER_LZMA2, 'preset': BASE_PRESET, 'dict_size': dict_size_for(size, max_dict)}
+
+    if content_class == 'text':
+        lzma2.update(lc=4, lp=0, pb=0)
+        return [lzma2]
+    if content_class == 'executable':
+        return [{'id': param}, lzma2]
+    if content_class == 'media':
+        align = int(math.log2(param)) if param & (param - 1) == 0 else 0
+        lzma2.update(lc=0, lp=min(align, 4), pb=min(align, 4))
+        return [{'id': lzma.FILTER_DELTA, 'dist': param}, lzma2]
+    if content_class == 'structured':
+        align = int(math.log2(param))
+        lzma2.update(lc=0, lp=align, pb=align)
+        return [lzma2]
+    if content_class == 'compressed':
+        return [{'id': lzma.FILTER_LZMA2, 'preset': 1, 'dict_size': dict_size_for(size, 1 << 20)}]
+    return [lzma2]
+
+
+def choose_filters(sample, size, max_dict=MAX_DICT):
+    """Returns (content class, filter chain) for a file of the given size."""
+    content_class, param = classify(sample[:SAMPLE_SIZE])
+    return content_class, filter_chain(content_class, param, size, max_dict)
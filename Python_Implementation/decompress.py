@@ -1,36 +1,16 @@
-import heapq
 import sys
 import struct
+import hashlib
 import os
 import lzma
+import zlib
+import shutil
 
-# --- Huffman Decompression ---
-
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-    
-    def __lt__(self, other):
-        return self.freq < other.freq
-
-def build_huffman_tree(frequency):
-    priority_queue = [HuffmanNode(char, freq) for char, freq in frequency.items()]
-    heapq.heapify(priority_queue)
-
-    while len(priority_queue) > 1:
-        left = heapq.heappop(priority_queue)
-        right = heapq.heappop(priority_queue)
-
-        merged = HuffmanNode(None, left.freq + right.freq)
-        merged.left = left
-        merged.right = right
-
-        heapq.heappush(priority_queue, merged)
+import chunk_store as chunking
+import huffman_core
+import memtrack
 
-    return priority_queue[0]
+# --- Huffman Decompression ---
 
 def huffman_decompress_bytes(file_handle):
     header_data = file_handle.read(5) 
@@ -48,74 +28,19 @@ def huffman_decompress_bytes(file_handle):
         char_code, freq = struct.unpack('<BI', entry_data)
         frequency[char_code] = freq
 
-    root = build_huffman_tree(frequency)
-
-    # Flatten tree for speed
-    # We will use lists as simple arrays: left_children, right_children, values
-    # Node 0 is root.
-    
-    # 1. Assign IDs and build arrays
-    next_node_id = 1
-    # Max nodes = 2 * unique_chars - 1. Safe upper bound is enough.
-    # Initial capacity
-    capacity = unique_chars * 2 + 100
-    left_children = [-1] * capacity
-    right_children = [-1] * capacity
-    node_values = [-1] * capacity
-    
-    # helper to populate
-    # returns node_id
-    def flatten(node):
-        nonlocal next_node_id, left_children, right_children, node_values
-        
-        if node is None:
-            return -1
-            
-        curr_id = next_node_id
-        next_node_id += 1
-        
-        # Check capacity (dynamic resize if needed, though unlikely with calculated bound)
-        if curr_id >= len(left_children):
-             extension = [-1] * len(left_children)
-             left_children.extend(extension)
-             right_children.extend(extension)
-             node_values.extend(extension)
-        
-        if node.left is None and node.right is None: # Leaf
-            left_children[curr_id] = -1 # Marker
-            right_children[curr_id] = -1
-            node_values[curr_id] = node.char
-        else:
-            # Internal
-            l_id = flatten(node.left)
-            r_id = flatten(node.right)
-            left_children[curr_id] = l_id
-            right_children[curr_id] = r_id
-            
-        return curr_id
+    # Same array-based tree the encoder built from this frequency table
+    tree = huffman_core.build_tree(frequency)
+    if tree is None:
+        return b""
 
-    # Reset root ID to 0 for convenience? Actually our helper uses 1-based or we can just start.
-    # Let's simple start next_node_id = 0
-    next_node_id = 0
-    
-    def flatten_root(node):
-        nonlocal next_node_id
-        if node is None: return -1
-        
-        my_id = next_node_id
-        next_node_id += 1
-        
-        if node.left is None and node.right is None:
-            left_children[my_id] = -2 # -2 indicates Leaf
-            node_values[my_id] = node.char
-        else:
-            l_id = flatten_root(node.left)
-            r_id = flatten_root(node.right)
-            left_children[my_id] = l_id
-            right_children[my_id] = r_id
-        return my_id
+    left_children = tree.left
+    right_children = tree.right
+    node_values = tree.symbol # -1 for internal nodes
+    root_id = tree.root
 
-    root_id = flatten_root(root)
+    # A single distinct byte gets a zero-length code: nothing to read
+    if node_values[root_id] >= 0:
+        return bytes([node_values[root_id]]) * total_chars
     
     extracted_chars = 0
     curr = root_id
@@ -138,7 +63,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2: # Leaf
+            if node_values[curr] >= 0: # Leaf
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -149,7 +74,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -160,7 +85,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -171,7 +96,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -182,7 +107,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -193,7 +118,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -204,7 +129,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -215,7 +140,7 @@ def huffman_decompress_bytes(file_handle):
             if bit == 0: curr = left_children[curr]
             else:        curr = right_children[curr]
             
-            if left_children[curr] == -2:
+            if node_values[curr] >= 0:
                 output.append(node_values[curr])
                 extracted_chars += 1
                 curr = root_id
@@ -229,34 +154,65 @@ def huffman_decompress_bytes(file_handle):
 
 # --- LZW Decompression ---
 
-def lzw_decompress(data):
+def lzw_decompress(data, variable_width=False, max_output=None):
     if not data:
         return b""
 
-    count = len(data) // 2
-    codes = struct.unpack(f'<{count}H', data)
-
-    dictionary = {i: bytes([i]) for i in range(256)}
-    next_code = 256
-# --- LZW Decompression ---
-
-def lzw_decompress(data):
-    if not data:
-        return b""
-
-    count = len(data) // 2
-    codes = struct.unpack(f'<{count}H', data)
+    if variable_width:
+        codes = lzw_unpack_varwidth(data)
+    else:
+        count = len(data) // 2
+        codes = struct.unpack(f'<{count}H', data)
+    return lzw_decode(codes, max_output)
 
-    # Initialize Dictionary (0-255)
-    # We use a list for O(1) integer access because codes are contiguous integers 0...N
-    # dictionary[i] = bytes
-    
-    # Pre-allocate distinct list for performance? Or just append.
-    # Since we reset, list is easier to clear.
-    
-    dictionary = [bytes([i]) for i in range(256)]
-    # Reserve slot 256 for CLEAR_CODE (though we don't output bytes for it)
-    dictionary.append(b'') 
+def lzw_unpack_varwidth(data):
+    """Inverse of compress.lzw_pack_varwidth: 9-16 bit codes, width reset on CLEAR_CODE."""
+    CLEAR_CODE = 256
+    (count,) = struct.unpack_from('<L', data, 0)
+    codes = []
+    append = codes.append
+
+    buffer_val = 0
+    bits_in_buffer = 0
+    pos = 4
+    index = 0
+    width = 9
+    next_growth = 256
+
+    for _ in range(count):
+        if index == next_growth:
+            width = max(9, min(16, (256 + index).bit_length()))
+            next_growth = (1 << width) - 256
+
+        while bits_in_buffer < width:
+            buffer_val = (buffer_val << 8) | data[pos]
+            pos += 1
+            bits_in_buffer += 8
+        bits_in_buffer -= width
+        code = buffer_val >> bits_in_buffer
+        buffer_val &= (1 << bits_in_buffer) - 1
+        append(code)
+
+        index += 1
+        if code == CLEAR_CODE:
+            index = 0
+            width = 9
+            next_growth = 256
+
+    return codes
+
+# Single-byte phrases 0-255 plus the CLEAR_CODE slot (256). These entries
+# never change, so a dictionary reset only has to drop what follows them.
+LZW_INITIAL_TABLE = tuple(bytes([i]) for i in range(256)) + (b'',)
+
+def lzw_decode(codes, max_output=None):
+    """
+    Rebuilds the original bytes from a sequence of LZW code integers.
+    max_output: raise ValueError once the output grows past this many bytes
+    (output can grow quadratically in the number of codes).
+    """
+    # List for O(1) integer access because codes are contiguous integers 0...N
+    dictionary = list(LZW_INITIAL_TABLE)
     
     CLEAR_CODE = 256
     next_code = 257
@@ -285,8 +241,7 @@ def lzw_decompress(data):
     for code in code_iter:
         if code == CLEAR_CODE:
             # RESET
-            dictionary = [bytes([i]) for i in range(256)]
-            dictionary.append(b'') # 256
+            del dictionary[257:]
             next_code = 257
             
             # Read next code immediately to restart sequence
@@ -306,6 +261,8 @@ def lzw_decompress(data):
             raise ValueError(f"Bad LZW code: {code}")
         
         result.extend(entry)
+        if max_output is not None and len(result) > max_output:
+            raise ValueError(f"LZW output exceeds {max_output} bytes")
         
         # Add new phrase to dictionary
         if next_code < MAX_DICT_SIZE:
@@ -317,10 +274,312 @@ def lzw_decompress(data):
         
     return bytes(result)
 
-def decompress_file(input_file, output_file):
+# --- Hybrid Decompression (Canonical Huffman over LZW Codes) ---
+
+HYBRID_LOOKUP_BITS = 14
+
+def hybrid_decompress_bytes(data):
+    """Decodes a flag 4 payload (see compress.hybrid_compress_bytes)."""
+    if len(data) < 12:
+        return b""
+    total_codes, alphabet_size, table_bytes = struct.unpack_from('<LLL', data, 0)
+    if total_codes == 0:
+        return b""
+
+    pos = 12 + table_bytes
+    length_table = zlib.decompress(data[12:pos])
+    if len(length_table) != alphabet_size:
+        raise ValueError("Corrupt hybrid length table")
+    max_len = max(length_table)
+
+    # Canonical code assignment: per-length counts -> first code of each length
+    bl_count = [0] * (max_len + 1)
+    for length in length_table:
+        if length:
+            bl_count[length] += 1
+    first_code = [0] * (max_len + 1)
+    offset = [0] * (max_len + 1)
+    code = 0
+    index = 0
+    for length in range(1, max_len + 1):
+        code = (code + bl_count[length - 1]) << 1 if length > 1 else 0
+        first_code[length] = code
+        offset[length] = index
+        index += bl_count[length]
+    sorted_symbols = sorted((sym for sym in range(alphabet_size) if length_table[sym]),
+                            key=lambda sym: (length_table[sym], sym))
+
+    # Direct lookup for codes up to HYBRID_LOOKUP_BITS long (peek -> symbol, length)
+    peek_bits = min(max_len, HYBRID_LOOKUP_BITS)
+    table_sym = [0] * (1 << peek_bits)
+    table_len = [0] * (1 << peek_bits)
+    for length in range(1, peek_bits + 1):
+        for i in range(bl_count[length]):
+            sym = sorted_symbols[offset[length] + i]
+            start = (first_code[length] + i) << (peek_bits - length)
+            for slot in range(start, start + (1 << (peek_bits - length))):
+                table_sym[slot] = sym
+                table_len[slot] = length
+    peek_mask = (1 << peek_bits) - 1
+
+    codes = []
+    append = codes.append
+    buffer_val = 0
+    bits_in_buffer = 0
+    data_len = len(data)
+
+    for _ in range(total_codes):
+        # Keep at least max_len bits buffered (zero padding past the end)
+        while bits_in_buffer < max_len:
+            buffer_val = (buffer_val << 8) | (data[pos] if pos < data_len else 0)
+            pos += 1
+            bits_in_buffer += 8
+
+        peek = (buffer_val >> (bits_in_buffer - peek_bits)) & peek_mask
+        length = table_len[peek]
+        if length:
+            append(table_sym[peek])
+        else:
+            # Long code: try each longer length against the canonical ranges
+            for length in range(peek_bits + 1, max_len + 1):
+                code = (buffer_val >> (bits_in_buffer - length)) & ((1 << length) - 1)
+                idx = code - first_code[length]
+                if 0 <= idx < bl_count[length]:
+                    append(sorted_symbols[offset[length] + idx])
+                    break
+            else:
+                raise ValueError("Corrupt hybrid bitstream")
+
+        bits_in_buffer -= length
+        buffer_val &= (1 << bits_in_buffer) - 1
+
+    return lzw_decode(codes)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def delta_header(data):
+    """Returns (reference name, reference sha256 hex, target size, body offset) of a flag 8 payload."""
+    (name_length,) = struct.unpack_from('<H', data, 0)
+    name = data[2:2 + name_length].decode('utf-8')
+    pos = 2 + name_length
+    digest = data[pos:pos + 32].hex()
+    (target_size,) = struct.unpack_from('<Q', data, pos + 32)
+    return name, digest, target_size, pos + 40
+
+def delta_decompress_bytes(data, reference_resolver):
+    """
+    Decodes a flag 8 payload (see compress.delta_compress_bytes).
+    reference_resolver(name) returns the reference bytes.
+    """
+    name, digest, target_size, pos = delta_header(data)
+    if reference_resolver is None:
+        raise ValueError(f"Delta file needs its reference '{name}'")
+    reference = reference_resolver(name)
+    if hashlib.sha256(reference).hexdigest() != digest:
+        raise ValueError(f"Reference '{name}' does not match the one this delta was made against")
+
+    body = lzma.decompress(data[pos:])
+    ops_length, ops_pos = _read_varint(body, 0)
+    ops_end = ops_pos + ops_length
+    literal_pos = ops_end
+
+    out = bytearray()
+    last_end = 0
+    while ops_pos < ops_end:
+        value, ops_pos = _read_varint(body, ops_pos)
+        length = value >> 1
+        if value & 1:
+            zigzag, ops_pos = _read_varint(body, ops_pos)
+            off = last_end + ((zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1))
+            out += reference[off:off + length]
+            last_end = off + length
+        else:
+            out += body[literal_pos:literal_pos + length]
+            literal_pos += length
+
+    if len(out) != target_size:
+        raise ValueError("Delta decoding produced the wrong size")
+    return bytes(out)
+
+# Chunk size for the low-memory (streaming) paths of flags 2, 3 and 9
+LOW_MEMORY_CHUNK = 1024 * 1024 # 1MB
+
+def stream_lzma(file_handle, out):
+    """Decodes an .xz stream (flags 3 and 9) while holding at most one chunk of output."""
+    decompressor = lzma.LZMADecompressor()
+    while not decompressor.eof:
+        if decompressor.needs_input:
+            chunk = file_handle.read(LOW_MEMORY_CHUNK)
+            if not chunk:
+                raise EOFError("Compressed data ended before the end-of-stream marker")
+        else:
+            chunk = b""
+        out.write(decompressor.decompress(chunk, max_length=LOW_MEMORY_CHUNK))
+
+def stream_chunk_manifest(file_handle, out, chunk_store):
+    """Flag 6: reassembles the file from chunk_store, one chunk at a time."""
+    if chunk_store is None:
+        raise ValueError("Chunk manifest (flag 6) needs the chunk store it was written to")
+    _, entries = chunking.unpack_manifest(file_handle.read())
+    for digest, length in entries:
+        chunk = chunk_store.get(digest)
+        if len(chunk) != length:
+            raise ValueError(f"Chunk {digest} has the wrong length")
+        out.write(chunk)
+
+def stream_chunk_container(file_handle, out):
+    """Flag 7: self-contained chunk container (inline compressed chunks)."""
+    _, count = chunking.HEADER.unpack(file_handle.read(chunking.HEADER.size))
+    for _ in range(count):
+        length, blob_length = chunking.INLINE_ENTRY.unpack(file_handle.read(chunking.INLINE_ENTRY.size))
+        chunk = chunking.unpack_blob(file_handle.read(blob_length))
+        if len(chunk) != length:
+            raise ValueError("Chunk container is corrupt")
+        out.write(chunk)
+
+MAX_DELTA_DEPTH = 8
+
+def directory_resolver(directory, chunk_store=None, depth=0):
+    """
+    reference_resolver for deltas downloaded next to their base: reads the
+    base from directory, decoding it first if it is itself an .lzh file.
+    """
+    def resolve(name):
+        if depth >= MAX_DELTA_DEPTH:
+            raise ValueError("Delta chain is too long")
+        path = os.path.join(directory, os.path.basename(name))
+        if not os.path.exists(path):
+            raise ValueError(f"Delta file needs its reference '{name}' next to it")
+        if not name.endswith('.lzh'):
+            with open(path, 'rb') as f:
+                return f.read()
+        scratch = f"{path}.{os.getpid()}.{depth}.ref"
+        try:
+            decompress_file(path, scratch, chunk_store=chunk_store,
+                            reference_resolver=directory_resolver(directory, chunk_store, depth + 1))
+            with open(scratch, 'rb') as f:
+                return f.read()
+        finally:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+    return resolve
+
+# --- Declared Output Size ---
+
+XZ_FOOTER_SIZE = 12
+
+def _xz_uncompressed_size(f, file_size):
+    """Total uncompressed size from the index of a single .xz stream starting at offset 1, or None."""
+    if file_size < 1 + 2 * XZ_FOOTER_SIZE:
+        return None
+    f.seek(file_size - XZ_FOOTER_SIZE)
+    footer = f.read(XZ_FOOTER_SIZE)
+    if footer[10:] != b'YZ':
+        return None
+    index_size = (struct.unpack_from('<L', footer, 4)[0] + 1) * 4
+    index_start = file_size - XZ_FOOTER_SIZE - index_size
+    if index_start < 1 + XZ_FOOTER_SIZE:
+        return None
+    f.seek(index_start)
+    index = f.read(index_size)
+    try:
+        if index[0] != 0:
+            return None
+        count, pos = _read_varint(index, 1)
+        blocks_size = 0
+        total = 0
+        for _ in range(count):
+            unpadded, pos = _read_varint(index, pos)
+            uncompressed, pos = _read_varint(index, pos)
+            blocks_size += (unpadded + 3) & ~3
+            total += uncompressed
+    except IndexError:
+        return None
+    # Only trust the index if it accounts for everything before it
+    # (concatenated streams would each have their own)
+    if 1 + XZ_FOOTER_SIZE + blocks_size != index_start:
+        return None
+    return total
+
+def declared_output_size(input_file):
+    """
+    Output size recorded in a .lzh file's header, or None for formats that
+    do not record it (LZW-based flags 1/4/5) and for truncated delta headers.
+    """
+    file_size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as f:
+        flag_byte = f.read(1)
+        if not flag_byte:
+            return 0
+        flag = flag_byte[0]
+        if flag == 2:
+            return file_size - 1
+        if flag == 0:
+            header = f.read(4)
+            return struct.unpack('<L', header)[0] if len(header) == 4 else 0
+        if flag in (3, 9):
+            return _xz_uncompressed_size(f, file_size)
+        if flag == 8:
+            length = f.read(2)
+            if len(length) != 2:
+                return None
+            f.seek(struct.unpack('<H', length)[0] + 32, os.SEEK_CUR)
+            size = f.read(8)
+            return struct.unpack('<Q', size)[0] if len(size) == 8 else None
+        if flag in (6, 7):
+            header = f.read(chunking.HEADER.size)
+            return chunking.HEADER.unpack(header)[0] if len(header) == chunking.HEADER.size else 0
+    return None
+
+def delta_reference(input_file):
+    """Reference name of a flag 8 (delta) file, or None for other or truncated files."""
+    with open(input_file, 'rb') as f:
+        if f.read(1) != b'\x08':
+            return None
+        length = f.read(2)
+        if len(length) != 2:
+            return None
+        name = f.read(struct.unpack('<H', length)[0])
+    try:
+        return name.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+def needs_low_memory(input_file):
+    """
+    memtrack.needs_low_memory for decoding input_file, priced on its declared
+    output size; files that do not declare one count as over any budget.
+    """
+    if memtrack.memory_budget is None:
+        return False
+    size = declared_output_size(input_file)
+    return size is None or memtrack.needs_low_memory(size, 'decompress')
+
+def decompress_file(input_file, output_file, low_memory=None, chunk_store=None,
+                    reference_resolver=None):
+    """
+    Restores input_file into output_file.
+    low_memory=None streams flags 2/3/9 automatically when the job's estimated
+    peak (from the declared output size) exceeds memtrack.memory_budget; other flags always decode in memory,
+    except the chunked flags 6/7, which always stream.
+    chunk_store is required for flag 6 manifests, and reference_resolver(name)
+    -> bytes for flag 8 deltas.
+    """
     if not os.path.exists(input_file):
         return
 
+    if low_memory is None:
+        low_memory = needs_low_memory(input_file)
+
     with open(input_file, 'rb') as f:
         # Read Flag
         flag_byte = f.read(1)
@@ -328,8 +587,22 @@ def decompress_file(input_file, output_file):
             return 
         
         flag = ord(flag_byte) # 1 or 0
-        
 
+        if flag in (6, 7):
+            with open(output_file, 'wb') as out:
+                if flag == 6:
+                    stream_chunk_manifest(f, out, chunk_store)
+                else:
+                    stream_chunk_container(f, out)
+            return
+
+        if low_memory and flag in (2, 3, 9):
+            with open(output_file, 'wb') as out:
+                if flag == 2:
+                    shutil.copyfileobj(f, out, LOW_MEMORY_CHUNK)
+                else:
+                    stream_lzma(f, out)
+            return
 
         if flag == 1:
             # Step 2: LZW
@@ -340,10 +613,19 @@ def decompress_file(input_file, output_file):
         elif flag == 2:
             # Identity Mode (Raw)
             final_data = f.read()
-        elif flag == 3:
-            # LZMA Mode
+        elif flag in (3, 9):
+            # LZMA Mode (flag 9: with a content-aware filter chain)
             compressed_data = f.read()
             final_data = lzma.decompress(compressed_data)
+        elif flag == 4:
+            # Hybrid Mode (Huffman over LZW codes)
+            final_data = hybrid_decompress_bytes(f.read())
+        elif flag == 5:
+            # LZW Mode (variable-width codes)
+            final_data = lzw_decompress(f.read(), variable_width=True)
+        elif flag == 8:
+            # Delta Mode (copy/insert against a reference)
+            final_data = delta_decompress_bytes(f.read(), reference_resolver)
         else:
             raise ValueError(f"Unknown compression flag: {flag}")
             
@@ -356,4 +638,8 @@ if __name__ == "__main__":
     if len(sys.argv) < 3:
         print(f"Usage: python {sys.argv[0]} <input_file> <output_file>")
     else:
-        decompress_file(sys.argv[1], sys.argv[2])
+        directory = os.path.dirname(os.path.abspath(sys.argv[1]))
+        chunk_dir = os.path.join(directory, '.chunks')
+        store = chunking.ChunkStore(chunk_dir) if os.path.isdir(chunk_dir) else None
+        decompress_file(sys.argv[1], sys.argv[2], chunk_store=store,
+                        reference_resolver=directory_resolver(directory, store))
@@ -1,34 +1,274 @@
-
 import os
-import datetime
+import sys
+import json
+import time
+import random
+import argparse
+
+# --- Synthetic Corpus Generator ---
+#
+# Deterministic test inputs for benchmarks and performance tests: the same
+# profile, size and seed always produce byte-identical output. Timestamps
+# come from a fixed synthetic clock instead of the wall clock, and data is
+# written in ~1MB blocks so multi-GB corpora stream with constant memory.
+#
+# Profiles:
+#   logs      server log lines whose vocabulary drifts as the file grows
+#   json      one JSON record per line
+#   csv       header + comma separated rows
+#   binary    uniformly random bytes (incompressible baseline)
+# plus near-duplicate file sets (generate_near_duplicates).
+
+BLOCK_SIZE = 1024 * 1024 # 1MB per write
+EPOCH = 1735689600 # 2025-01-01 00:00:00 UTC, start of the synthetic clock
+
+LEVELS = ["INFO", "ERROR", "DEBUG", "WARN"]
+MESSAGES = [
+    "User login successful for user_id: ",
+    "Database connection established to cluster-01",
+    "GET /api/v1/resource HTTP/1.1 200",
+    "Failed to parse request body: invalid JSON",
+    "Cache hit for key: user_profile_",
+    "Worker process started successfully"
+]
+ACTIONS = ["login", "logout", "upload", "download", "compress", "decompress", "delete"]
+
+
+class SyntheticClock:
+    """Monotonic fake time; formats each second only once."""
+
+    def __init__(self, rng, start=EPOCH):
+        self.rng = rng
+        self.now = start
+        self._cached_second = None
+        self._cached_text = ""
+
+    def tick(self):
+        self.now += self.rng.random() * 0.2
+        second = int(self.now)
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_text = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(second))
+        return self._cached_text
+
+
+def random_word(rng, min_len=3, max_len=10):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(min_len, max_len)))
+
+
+# --- Profiles (each yields text/bytes blocks of roughly BLOCK_SIZE) ---
+
+def log_blocks(rng, drift_every=4 * 1024 * 1024):
+    """
+    Log lines in the original example_server.log format. Every drift_every
+    bytes a quarter of the message templates and user/key names is replaced,
+    so LZW-style dictionaries go stale the way real service logs do.
+    """
+    clock = SyntheticClock(rng)
+    messages = list(MESSAGES)
+    names = [random_word(rng) for _ in range(50)]
+    produced = 0
+    next_drift = drift_every
+
+    while True:
+        lines = []
+        size = 0
+        while size < BLOCK_SIZE:
+            timestamp = clock.tick()
+            level = LEVELS[rng.randrange(len(LEVELS))]
+            msg = messages[rng.randrange(len(messages))]
+            name = names[rng.randrange(len(names))]
+            line = f"[{timestamp}] {level}: {msg}{name}_{rng.randrange(100)}\n"
+            lines.append(line)
+            size += len(line)
+        produced += size
+        yield "".join(lines)
+
+        if produced >= next_drift:
+            next_drift += drift_every
+            for _ in range(len(messages) // 4 + 1):
+                messages[rng.randrange(len(messages))] = (
+                    f"{random_word(rng).capitalize()} {random_word(rng)} {random_word(rng)}: ")
+            for _ in range(len(names) // 4):
+                names[rng.randrange(len(names))] = random_word(rng)
+
+
+def json_blocks(rng):
+    clock = SyntheticClock(rng)
+    users = [random_word(rng) for _ in range(200)]
+    record_id = 0
+    while True:
+        lines = []
+        size = 0
+        while size < BLOCK_SIZE:
+            record_id += 1
+            record = {
+                "id": record_id,
+                "ts": clock.tick(),
+                "user": users[rng.randrange(len(users))],
+                "action": ACTIONS[rng.randrange(len(ACTIONS))],
+                "latency_ms": round(rng.lognormvariate(3, 0.8), 2),
+                "ok": rng.random() > 0.05,
+                "tags": [random_word(rng, 2, 5) for _ in range(rng.randrange(3))]
+            }
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            lines.append(line)
+            size += len(line)
+        yield "".join(lines)
+
+
+def csv_blocks(rng):
+    clock = SyntheticClock(rng)
+    users = [random_word(rng) for _ in range(200)]
+    row_id = 0
+    first = True
+    while True:
+        lines = ["id,timestamp,user,action,bytes,latency_ms\n"] if first else []
+        first = False
+        size = 0
+        while size < BLOCK_SIZE:
+            row_id += 1
+            line = (f"{row_id},{clock.tick()},{users[rng.randrange(len(users))]},"
+                    f"{ACTIONS[rng.randrange(len(ACTIONS))]},{rng.randrange(1 << 20)},"
+                    f"{rng.randrange(5000) / 10}\n")
+            lines.append(line)
+            size += len(line)
+        yield "".join(lines)
+
 
-def generate_log_file(filename, size_mb):
+def binary_blocks(rng):
+    while True:
+        yield rng.randbytes(BLOCK_SIZE)
+
+
+PROFILES = {
+    'logs': log_blocks,
+    'json': json_blocks,
+    'csv': csv_blocks,
+    'binary': binary_blocks,
+}
+
+
+def generate(profile, filename, size_bytes, seed=0):
+    """Writes exactly size_bytes of the given profile to filename."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile: {profile} (choose from {', '.join(PROFILES)})")
+
+    rng = random.Random(seed)
+    remaining = size_bytes
+    with open(filename, 'wb') as f:
+        for block in PROFILES[profile](rng):
+            if isinstance(block, str):
+                block = block.encode('ascii')
+            if len(block) >= remaining:
+                f.write(block[:remaining])
+                break
+            f.write(block)
+            remaining -= len(block)
+    return size_bytes
+
+
+def mutate_blocks(rng, blocks, mutation_rate):
+    """
+    Yields a copy of a stream of blocks with roughly mutation_rate of it
+    edited in small spans. Edits are placed per block, so only one block is
+    held at a time; a replace/delete running past a block's end carries on
+    into the next one.
+    """
+    skip = 0 # bytes still to drop from the next block(s)
+    for data in blocks:
+        if skip >= len(data):
+            skip -= len(data)
+            continue
+        out = bytearray()
+        pos = skip
+        edits = max(1, int(len(data) * mutation_rate / 32))
+        points = sorted(rng.randrange(len(data)) for _ in range(edits))
+        for point in points:
+            if point < pos:
+                continue
+            out += data[pos:point]
+            span = rng.randint(1, 64)
+            op = rng.randrange(3)
+            if op == 0:   # replace
+                out += rng.randbytes(span)
+                pos = point + span
+            elif op == 1: # insert
+                out += rng.randbytes(span)
+                pos = point
+            else:         # delete
+                pos = point + span
+        out += data[pos:]
+        skip = max(0, pos - len(data))
+        yield bytes(out)
+
+
+def mutate(rng, data, mutation_rate):
+    """In-memory mutate_blocks: an edited copy of data."""
+    return b"".join(mutate_blocks(rng, [data] if data else [], mutation_rate))
+
+
+def generate_near_duplicates(directory, count, size_bytes, seed=0, profile='logs', mutation_rate=0.01):
+    """
+    Writes count files of about size_bytes each into directory: version_000
+    is a base corpus and every later version is a lightly edited copy of the
+    previous one (like successive revisions of one document). Each version
+    is streamed from the previous one a block at a time.
+    Returns the list of paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    path = os.path.join(directory, "version_000")
+    generate(profile, path, size_bytes, seed)
+
+    paths = [path]
+    for i in range(1, count):
+        previous, path = path, os.path.join(directory, f"version_{i:03d}")
+        with open(previous, 'rb') as src, open(path, 'wb') as out:
+            blocks = iter(lambda: src.read(BLOCK_SIZE), b"")
+            for block in mutate_blocks(rng, blocks, mutation_rate):
+                out.write(block)
+        paths.append(path)
+    return paths
+
+
+def generate_log_file(filename, size_mb, seed=0):
     print(f"Generating {size_mb}MB log file: {filename}...")
-    target_size = size_mb * 1024 * 1024
-    
-    # Common log patterns
-    levels = ["INFO", "ERROR", "DEBUG", "WARN"]
-    messages = [
-        "User login successful for user_id: ",
-        "Database connection established to cluster-01",
-        "GET /api/v1/resource HTTP/1.1 200",
-        "Failed to parse request body: invalid JSON",
-        "Cache hit for key: user_profile_",
-        "Worker process started successfully"
-    ]
-    
-    with open(filename, 'w') as f:
-        current_size = 0
-        while current_size < target_size:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            level = levels[current_size % len(levels)]
-            msg = messages[current_size % len(messages)]
-            line = f"[{timestamp}] {level}: {msg}{current_size % 100}\n"
-            f.write(line)
-            current_size += len(line)
-            
+    generate('logs', filename, int(size_mb * 1024 * 1024), seed)
     actual_size = os.path.getsize(filename)
     print(f"Generated file size: {actual_size / (1024*1024):.2f} MB")
 
+
+def parse_size(text):
+    """'512', '64K', '10MB', '2G' -> bytes."""
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    number = text.rstrip('KMG')
+    return int(float(number) * units[text[len(number):]])
+
+
 if __name__ == "__main__":
-    generate_log_file("example_server.log", 10)
+    if len(sys.argv) == 1:
+        generate_log_file("example_server.log", 10)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Deterministic synthetic corpus generator.")
+    parser.add_argument('profile', choices=list(PROFILES) + ['near-duplicates'])
+    parser.add_argument('output', help="output file (or directory for near-duplicates)")
+    parser.add_argument('--size', default='10MB', help="bytes per file, e.g. 512K, 10MB, 2GB")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--count', type=int, default=10, help="near-duplicates: number of versions")
+    parser.add_argument('--base-profile', default='logs', choices=list(PROFILES),
+                        help="near-duplicates: profile of the base version")
+    parser.add_argument('--mutation-rate', type=float, default=0.01,
+                        help="near-duplicates: fraction of bytes edited per version")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    if args.profile == 'near-duplicates':
+        paths = generate_near_duplicates(args.output, args.count, size, args.seed,
+                                         args.base_profile, args.mutation_rate)
+        print(f"Wrote {len(paths)} versions to {args.output}")
+    else:
+        generate(args.profile, args.output, size, args.seed)
+        print(f"Wrote {size} bytes of '{args.profile}' to {args.output}")
@@ -0,0 +1,215 @@
+# --- Shared Huffman Core (Array-Based) ---
+#
+# One Huffman implementation for the encoder, the decoder and the simulator.
+# Trees live in parallel lists instead of one Python object per node:
+#
+#   left[i], right[i]  child node ids (-1 for leaves)
+#   symbol[i]          byte/code value for leaves, -1 for internal nodes
+#   weight[i]          frequency of the subtree
+#
+# Leaves take ids 0..n-1 in the order the frequencies were given, internal
+# nodes follow in merge order, so every child id is smaller than its parent's.
+# That lets all traversals below run as flat loops without recursion.
+
+
+class HuffmanTree:
+    __slots__ = ('left', 'right', 'symbol', 'weight', 'root')
+
+    def __init__(self, left, right, symbol, weight, root):
+        self.left = left
+        self.right = right
+        self.symbol = symbol
+        self.weight = weight
+        self.root = root
+
+    def __len__(self):
+        return len(self.symbol)
+
+
+def _sift_down(heap, weight, startpos, pos):
+    # Same algorithm as heapq._siftdown, comparing node weights only
+    newitem = heap[pos]
+    new_weight = weight[newitem]
+    while pos > startpos:
+        parentpos = (pos - 1) >> 1
+        parent = heap[parentpos]
+        if new_weight < weight[parent]:
+            heap[pos] = parent
+            pos = parentpos
+            continue
+        break
+    heap[pos] = newitem
+
+
+def _sift_up(heap, weight, pos):
+    # Same algorithm as heapq._siftup, comparing node weights only
+    endpos = len(heap)
+    startpos = pos
+    newitem = heap[pos]
+    childpos = 2 * pos + 1
+    while childpos < endpos:
+        rightpos = childpos + 1
+        if rightpos < endpos and not weight[heap[childpos]] < weight[heap[rightpos]]:
+            childpos = rightpos
+        heap[pos] = heap[childpos]
+        pos = childpos
+        childpos = 2 * pos + 1
+    heap[pos] = newitem
+    _sift_down(heap, weight, startpos, pos)
+
+
+def build_tree(frequency):
+    """
+    Builds the Huffman tree for a {symbol: freq} mapping (iteration order matters).
+
+    Ties are broken exactly like the original heapq-of-HuffmanNode build, which
+    is what the .lzh format (flags 0 and 1) relies on: the decoder rebuilds the
+    tree from the stored frequency table, so the shape must never change.
+    """
+    symbol = list(frequency.keys())
+    weight = list(frequency.values())
+    n = len(symbol)
+    if n == 0:
+        return None
+
+    left = [-1] * n
+    right = [-1] * n
+
+    heap = list(range(n))
+    for i in reversed(range(n // 2)):
+        _sift_up(heap, weight, i)
+
+    while len(heap) > 1:
+        # heappop
+        last = heap.pop()
+        a = heap[0]
+        heap[0] = last
+        _sift_up(heap, weight, 0)
+        # heappop
+        last = heap.pop()
+        if heap:
+            b = heap[0]
+            heap[0] = last
+            _sift_up(heap, weight, 0)
+        else:
+            b = last
+
+        node_id = len(symbol)
+        left.append(a)
+        right.append(b)
+        symbol.append(-1)
+        weight.append(weight[a] + weight[b])
+
+        # heappush
+        heap.append(node_id)
+        _sift_down(heap, weight, 0, len(heap) - 1)
+
+    return HuffmanTree(left, right, symbol, weight, heap[0])
+
+
+def code_table(tree, alphabet_size=256):
+    """
+    Returns (codes, lengths) lists indexed by symbol, walking the tree with an
+    explicit stack. Left edges are 0 and right edges are 1.
+    """
+    codes = [0] * alphabet_size
+    lengths = [0] * alphabet_size
+    if tree is None:
+        return codes, lengths
+
+    left, right, symbol = tree.left, tree.right, tree.symbol
+    stack = [(tree.root, 0, 0)]
+    while stack:
+        node, code, length = stack.pop()
+        sym = symbol[node]
+        if sym >= 0:
+            codes[sym] = code
+            lengths[sym] = length
+        else:
+            stack.append((right[node], (code << 1) | 1, length + 1))
+            stack.append((left[node], code << 1, length + 1))
+    return codes, lengths
+
+
+def symbol_label(sym):
+    # Printable ASCII as-is, everything else as hex (keeps D3 labels short)
+    if 32 <= sym <= 126:
+        return chr(sym)
+    return f"x{sym:02X}"
+
+
+def tree_to_json(tree):
+    """Nested {"name", "value", "children"} dicts for the D3 tree views."""
+    if tree is None:
+        return None
+
+    left, right, symbol, weight = tree.left, tree.right, tree.symbol, tree.weight
+    nodes = [None] * len(symbol)
+    # Children always have smaller ids, so one forward pass builds every subtree
+    for i in range(len(symbol)):
+        sym = symbol[i]
+        if sym >= 0:
+            nodes[i] = {"name": symbol_label(sym), "value": weight[i]}
+        else:
+            nodes[i] = {"name": "", "value": weight[i], "children": [nodes[left[i]], nodes[right[i]]]}
+    return nodes[tree.root]
+
+
+# --- Code Lengths (Two-Queue Build) ---
+
+def code_lengths(frequency):
+    """
+    Optimal code length per symbol for a {symbol: freq} mapping, using the
+    O(n) two-queue construction over frequencies sorted once up front.
+    Only lengths are produced; canonical codecs derive the codes from them.
+    """
+    items = sorted(frequency.items(), key=lambda kv: (kv[1], kv[0]))
+    n = len(items)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {items[0][0]: 1}
+
+    weight = [freq for _, freq in items]
+    parent = [0] * (2 * n - 1)
+
+    # Queue 1: the sorted leaves 0..n-1. Queue 2: merged nodes n.., which are
+    # created in non-decreasing weight order, so both stay sorted.
+    leaf_pos = 0
+    merged_pos = n
+    for node_id in range(n, 2 * n - 1):
+        picked = []
+        for _ in range(2):
+            if leaf_pos < n and (merged_pos >= node_id or weight[leaf_pos] <= weight[merged_pos]):
+                picked.append(leaf_pos)
+                leaf_pos += 1
+            else:
+                picked.append(merged_pos)
+                merged_pos += 1
+        weight.append(weight[picked[0]] + weight[picked[1]])
+        parent[picked[0]] = node_id
+        parent[picked[1]] = node_id
+
+    # Depths top-down: the root is the last node and parents have larger ids
+    depth = [0] * (2 * n - 1)
+    for node_id in range(2 * n - 3, -1, -1):
+        depth[node_id] = depth[parent[node_id]] + 1
+
+    return {items[i][0]: depth[i] for i in range(n)}
+
+
+def canonical_codes(lengths):
+    """
+    Assigns canonical codes from a {symbol: length} mapping: shorter codes
+    first, ties by symbol value. Returns {symbol: (code, length)}.
+    """
+    ordered = sorted(lengths.items(), key=lambda kv: (kv[1], kv[0]))
+    codes = {}
+    code = 0
+    prev_len = 0
+    for sym, length in ordered:
+        code <<= (length - prev_len)
+        codes[sym] = (code, length)
+        code += 1
+        prev_len = length
+    return codes
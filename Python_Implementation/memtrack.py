@@ -0,0 +1,94 @@
+import threading
+import tracemalloc
+
+from admission import estimate_cost
+
+# --- Per-Job Memory Accounting ---
+#
+# PeakTracker measures the peak Python heap growth of one job with
+# tracemalloc. tracemalloc is process-wide and slows allocations down, so
+# tracking is opt-in. Its peak is only reset when no other tracked job is
+# running, so peaks of jobs that overlap in time include each other's
+# allocations (treat them as an upper bound under concurrency).
+#
+# memory_budget switches the codecs to their chunked, low-memory paths when
+# a job's estimated peak (same estimate as admission control) exceeds it.
+
+memory_budget = None # bytes; None disables the automatic low-memory switch
+
+
+def needs_low_memory(size, kind):
+    if memory_budget is None:
+        return False
+    memory, _ = estimate_cost(size, kind)
+    return memory > memory_budget
+
+
+class MemoryMetrics:
+    """Aggregated peaks per job kind, reported by /stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def record(self, kind, peak_bytes, low_memory):
+        with self._lock:
+            entry = self._kinds.setdefault(kind, {
+                'jobs': 0, 'low_memory_jobs': 0, 'last_peak': 0, 'max_peak': 0
+            })
+            entry['jobs'] += 1
+            if low_memory:
+                entry['low_memory_jobs'] += 1
+            if peak_bytes is not None:
+                entry['last_peak'] = peak_bytes
+                entry['max_peak'] = max(entry['max_peak'], peak_bytes)
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(entry) for kind, entry in self._kinds.items()}
+
+
+metrics = MemoryMetrics()
+
+_lock = threading.Lock()
+_active = 0
+_started_tracing = False
+
+
+class PeakTracker:
+    """
+    with PeakTracker('lzma', enabled=True) as tracker: ...
+    tracker.peak_bytes is the job's peak (None when tracking is disabled).
+    """
+
+    def __init__(self, kind, enabled=True, low_memory=False):
+        self.kind = kind
+        self.enabled = enabled
+        self.low_memory = low_memory
+        self.peak_bytes = None
+        self._baseline = 0
+
+    def __enter__(self):
+        global _active, _started_tracing
+        if self.enabled:
+            with _lock:
+                if _active == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _started_tracing = True
+                if _active == 0:
+                    tracemalloc.reset_peak()
+                _active += 1
+                self._baseline, _ = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active, _started_tracing
+        if self.enabled:
+            with _lock:
+                _, peak = tracemalloc.get_traced_memory()
+                self.peak_bytes = max(0, peak - self._baseline)
+                _active -= 1
+                if _active == 0 and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+        metrics.record(self.kind, self.peak_bytes, self.low_memory)
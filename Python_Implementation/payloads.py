@@ -0,0 +1,47 @@
+import io
+
+import compress
+import decompress
+
+# --- In-memory .lzh payloads ---
+#
+# Small payloads for /api/compress and /api/decompress, encoded and decoded
+# without touching the disk: flag 5 for LZW (variable width), flag 0 for
+# Huffman, flag 2 (Identity) when the codec does not help.
+
+PAYLOAD_CODECS = ('lzw', 'huffman')
+
+
+def compress_payload(data, codec='lzw'):
+    """flag + payload, or Identity (flag 2) when the codec does not help."""
+    if codec == 'lzw':
+        flag, packed = b'\x05', compress.lzw_compress(data, variable_width=True)
+    elif codec == 'huffman':
+        flag, packed = b'\x00', compress.huffman_compress_bytes(data)
+    else:
+        raise ValueError(f"Unknown payload codec: {codec}")
+    if len(packed) < len(data):
+        return flag + packed
+    return b'\x02' + data
+
+
+def decompress_payload(blob, max_output=None):
+    """
+    Decodes a flag 5, 0 or 2 payload. With max_output, raises ValueError for
+    payloads that decode (or declare) more than that many bytes.
+    """
+    if not blob:
+        return b""
+    flag, body = blob[0], blob[1:]
+    if flag == 5:
+        return decompress.lzw_decompress(body, variable_width=True, max_output=max_output)
+    if flag == 0:
+        declared = int.from_bytes(body[:4], 'little')
+        if max_output is not None and declared > max_output:
+            raise ValueError(f"Huffman payload declares {declared} bytes, over {max_output}")
+        return decompress.huffman_decompress_bytes(io.BytesIO(body))
+    if flag == 2:
+        if max_output is not None and len(body) > max_output:
+            raise ValueError(f"Payload exceeds {max_output} bytes")
+        return bytes(body)
+    raise ValueError(f"Unsupported payload flag for in-memory decoding: {flag}")
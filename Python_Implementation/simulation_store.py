@@ -0,0 +1,146 @@
+import sys
+import struct
+import threading
+import uuid
+
+from array import array
+from collections import OrderedDict
+
+# --- Simulation Artifact Store ---
+#
+# Keeps the bulky parts of a simulation (bit strings, LZW codes, LZW
+# dictionary) in packed binary form under a simulation ID, so the simulator
+# can page through them instead of receiving everything as JSON.
+#
+# Artifacts and their element units:
+#   huffman_binary, hybrid_binary   bits, packed MSB-first
+#   lzw_codes                       uint16 little-endian per code
+#   lzw_dict                        <HHB records: code, prefix_code, byte (sorted by code)
+
+BIT_ARTIFACTS = ('huffman_binary', 'hybrid_binary')
+ARTIFACTS = BIT_ARTIFACTS + ('lzw_codes', 'lzw_dict')
+DICT_RECORD = struct.Struct('<HHB')
+
+
+def pack_bits(bit_string):
+    """'0'/'1' string -> (packed bytes, bit count); the last byte is zero padded."""
+    nbits = len(bit_string)
+    if nbits == 0:
+        return b"", 0
+    pad = (-nbits) % 8
+    value = int(bit_string, 2) << pad
+    return value.to_bytes((nbits + pad) // 8, 'big'), nbits
+
+
+def slice_bits(packed, nbits, offset, limit):
+    """Bits [offset, offset+limit) of a packed bit string, repacked from bit 0."""
+    end = min(nbits, offset + limit)
+    if offset >= end:
+        return b"", 0
+    first_byte = offset // 8
+    last_byte = (end + 7) // 8
+    value = int.from_bytes(packed[first_byte:last_byte], 'big')
+    # Drop bits past 'end', then bits before 'offset'
+    value >>= last_byte * 8 - end
+    count = end - offset
+    value &= (1 << count) - 1
+    pad = (-count) % 8
+    return (value << pad).to_bytes((count + pad) // 8, 'big'), count
+
+
+def pack_codes(codes):
+    packed = array('H', codes)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def pack_dict(dictionary):
+    """Raw LZW dictionary {(prefix_code, byte): code} -> records sorted by code."""
+    records = bytearray()
+    for (prefix, byte_val), code in sorted(dictionary.items(), key=lambda kv: kv[1]):
+        records.extend(DICT_RECORD.pack(code, prefix, byte_val))
+    return bytes(records)
+
+
+class SimulationStore:
+    """Bounded in-memory LRU of packed simulation artifacts."""
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # sim_id -> {artifact: (packed, total)}
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self):
+        sim_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[sim_id] = {}
+            self._sizes[sim_id] = 0
+            self._evict()
+        return sim_id
+
+    def put(self, sim_id, artifact, packed, total):
+        with self._lock:
+            entry = self._entries.get(sim_id)
+            if entry is None:
+                return
+            entry[artifact] = (packed, total)
+            self._sizes[sim_id] += len(packed)
+            self._total_bytes += len(packed)
+            self._evict(keep=sim_id)
+
+    def _evict(self, keep=None):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._total_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            del self._entries[oldest]
+            self._total_bytes -= self._sizes.pop(oldest)
+
+    def compact_part(self, sim_id, payload):
+        """
+        Moves the bulky fields of one simulate_stream part (run with raw_dict=True)
+        into the store, replacing each with its element count.
+        """
+        compact = dict(payload)
+        for artifact in ARTIFACTS:
+            if artifact not in payload:
+                continue
+            value = compact.pop(artifact)
+            if artifact in BIT_ARTIFACTS:
+                packed, total = pack_bits(value)
+            elif artifact == 'lzw_codes':
+                packed, total = pack_codes(value), len(value)
+            else:
+                packed, total = pack_dict(value), len(value)
+            self.put(sim_id, artifact, packed, total)
+            compact[artifact + '_count'] = total
+        return compact
+
+    def read(self, sim_id, artifact, offset=0, limit=None):
+        """
+        Returns (payload bytes, total elements, elements in payload),
+        or None if the simulation or artifact is unknown (or was evicted).
+        """
+        with self._lock:
+            entry = self._entries.get(sim_id)
+            if entry is None or artifact not in entry:
+                return None
+            self._entries.move_to_end(sim_id)
+            packed, total = entry[artifact]
+
+        offset = max(0, min(offset, total))
+        if limit is None:
+            limit = total - offset
+        limit = max(0, min(limit, total - offset))
+
+        if artifact in BIT_ARTIFACTS:
+            payload, count = slice_bits(packed, total, offset, limit)
+            return payload, total, count
+
+        width = 2 if artifact == 'lzw_codes' else DICT_RECORD.size
+        return packed[offset * width:(offset + limit) * width], total, limit
@@ -120,6 +120,9 @@ async function processFile(mode) {
             if (result.is_identity) {
                 log("Note: File appears incompressible (e.g. already a .docx/zip). Stored in Identity Mode to prevent size explosion.", 'info');
             }
+            if (result.low_memory && result.codec) {
+                log(`Note: Large file, used the low-memory path (codec: ${result.codec}).`, 'info');
+            }
             log(mode === 'compress' ? "Optimization Success." : "Restoration Success.");
             displayResults(result);
             downloadFile(result.download_url, result.filename);
@@ -6,11 +6,16 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // UI Elements
     const lzwDictBody = document.getElementById('lzwDictBody');
+    const lzwDictContainer = document.getElementById('lzwDictContainer');
     const treeContainer = document.getElementById('huffmanTreeContainer');
     const huffmanBinaryOutput = document.getElementById('huffmanBinaryOutput');
     const lzwCodesOutput = document.getElementById('lzwCodesOutput');
     const hybridTreeContainer = document.getElementById('hybridTreeContainer');
     const hybridBinaryOutput = document.getElementById('hybridBinaryOutput');
+    const huffmanSize = document.getElementById('huffmanSize');
+    const lzwSize = document.getElementById('lzwSize');
+    const hybridSize = document.getElementById('hybridSize');
+    const simStatus = document.getElementById('simStatus');
 
     // Tabs
     const tabBtns = document.querySelectorAll('.tab-btn');
@@ -38,6 +43,7 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     clearBtn.addEventListener('click', () => {
+        if (activeRequest) activeRequest.abort();
         input.value = '';
         charCount.innerText = '0 bytes';
         resetUI();
@@ -49,45 +55,185 @@ document.addEventListener('DOMContentLoaded', () => {
         simulate();
     });
 
+    // Only the latest request may update the UI
+    let activeRequest = null;
+
     async function simulate() {
         const text = input.value;
+        if (activeRequest) activeRequest.abort();
         if (!text) {
             resetUI();
             return;
         }
 
+        const controller = new AbortController();
+        activeRequest = controller;
+
         try {
-            const response = await fetch('/api/simulate', {
+            const response = await fetch('/api/simulate/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: text })
+                body: JSON.stringify({ text: text }),
+                signal: controller.signal
             });
 
-            const data = await response.json();
-            if (data.error) throw new Error(data.error);
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || response.statusText);
+            }
+
+            // NDJSON: render each analysis as soon as its line arrives
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
 
-            updateUI(data);
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+
+                let newline;
+                while ((newline = buffered.indexOf('\n')) >= 0) {
+                    const line = buffered.slice(0, newline);
+                    buffered = buffered.slice(newline + 1);
+                    if (line.trim()) updatePart(JSON.parse(line));
+                }
+            }
         } catch (err) {
-            console.error('Simulation failed:', err);
+            if (err.name !== 'AbortError') console.error('Simulation failed:', err);
+        } finally {
+            if (activeRequest === controller) activeRequest = null;
+        }
+    }
+
+    function updatePart(part) {
+        switch (part.part) {
+            case 'sizes':
+                startSimulation(part.id);
+                renderSizes(part);
+                renderStatus(null);
+                break;
+            case 'huffman':
+                renderHuffmanTree(part.huffman_tree, "#huffmanTreeContainer");
+                attachPager(huffmanBinaryOutput, 'huffman_binary', part.huffman_binary_count, BIT_PAGE, decodeBits, '');
+                break;
+            case 'lzw':
+                lzwDictBody.innerHTML = '';
+                attachPager(lzwDictContainer, 'lzw_dict', part.lzw_dict_count, DICT_PAGE, decodeDict, null);
+                attachPager(lzwCodesOutput, 'lzw_codes', part.lzw_codes_count, CODE_PAGE, decodeCodes, ', ');
+                break;
+            case 'hybrid':
+                renderHuffmanTree(part.hybrid_tree, "#hybridTreeContainer");
+                attachPager(hybridBinaryOutput, 'hybrid_binary', part.hybrid_binary_count, BIT_PAGE, decodeBits, '');
+                break;
+            case 'status':
+                renderStatus(part.partial);
+                break;
         }
     }
 
-    function updateUI(data) {
-        // Update Huffman Tree
-        renderHuffmanTree(data.huffman_tree, data.huffman_binary, "#huffmanTreeContainer", huffmanBinaryOutput);
+    // --- Paged artifacts ---
+    // Bits, codes and dictionary rows stay on the server in packed form
+    // (/api/simulations/<id>/<artifact>); we fetch one page at a time and the
+    // next page only when the user scrolls to the end of what is shown.
+    const BIT_PAGE = 8192;
+    const CODE_PAGE = 2048;
+    const DICT_PAGE = 500;
+    let simulationId = null;
 
-        // Update LZW Dictionary
-        renderLZWDict(data.lzw_dict, data.lzw_codes);
+    function startSimulation(id) {
+        simulationId = id;
+    }
 
-        // Update Hybrid Tree
-        renderHuffmanTree(data.hybrid_tree, data.hybrid_binary, "#hybridTreeContainer", hybridBinaryOutput);
+    function decodeBits(buffer, count) {
+        const bytes = new Uint8Array(buffer);
+        let bits = '';
+        for (const b of bytes) bits += b.toString(2).padStart(8, '0');
+        return bits.slice(0, count);
     }
 
+    function decodeCodes(buffer, count) {
+        const view = new DataView(buffer);
+        const codes = [];
+        for (let i = 0; i < count; i++) codes.push(view.getUint16(i * 2, true));
+        return codes.join(', ');
+    }
 
-    function renderHuffmanTree(treeData, binaryStr, containerSelector, outputElement) {
+    function decodeDict(buffer, count) {
+        // <HHB records: code, prefix_code, byte
+        const view = new DataView(buffer);
+        const rows = document.createDocumentFragment();
+        for (let i = 0; i < count; i++) {
+            const code = view.getUint16(i * 5, true);
+            const prefix = view.getUint16(i * 5 + 2, true);
+            const byteVal = view.getUint8(i * 5 + 4);
+            const row = document.createElement('tr');
+            row.innerHTML = `
+                <td style="padding: 0.5rem; border-bottom: 1px solid rgba(255,255,255,0.05); color: #f1f5f9;">${prefix} + ${byteVal}</td>
+                <td style="padding: 0.5rem; border-bottom: 1px solid rgba(255,255,255,0.05); text-align: right; color: var(--accent);">${code}</td>
+            `;
+            rows.appendChild(row);
+        }
+        return rows;
+    }
+
+    // separator: text joined between pages, or null to append DOM rows to the dict table
+    function attachPager(element, artifact, total, pageSize, decode, separator) {
+        const id = simulationId;
+        let loaded = 0;
+        let loading = false;
+
+        if (separator !== null) element.innerText = '';
+
+        async function loadPage() {
+            if (loading || loaded >= total || id !== simulationId) return;
+            loading = true;
+            try {
+                const response = await fetch(`/api/simulations/${id}/${artifact}?offset=${loaded}&limit=${pageSize}`);
+                if (!response.ok || id !== simulationId) return;
+                const count = parseInt(response.headers.get('X-Count'), 10);
+                const page = decode(await response.arrayBuffer(), count);
+
+                if (separator === null) {
+                    lzwDictBody.appendChild(page);
+                } else {
+                    element.innerText += (loaded > 0 ? separator : '') + page;
+                }
+                loaded += count;
+            } finally {
+                loading = false;
+            }
+        }
+
+        element.onscroll = () => {
+            if (element.scrollTop + element.clientHeight >= element.scrollHeight - 20) loadPage();
+        };
+        loadPage();
+    }
+
+    function renderSizes(sizes) {
+        // null: the analysis was capped or timed out, so there is no full-input size
+        const format = size => size == null ? 'n/a (capped)' : `(${size} B)`;
+        huffmanSize.innerText = format(sizes.huffman);
+        lzwSize.innerText = format(sizes.lzw);
+        hybridSize.innerText = format(sizes.hybrid);
+    }
+
+    function renderStatus(partial) {
+        // Analyses that were capped or timed out on the server
+        if (!partial) {
+            simStatus.textContent = '';
+            simStatus.style.display = 'none';
+            return;
+        }
+        simStatus.textContent = 'Partial results: ' + Object.entries(partial)
+            .map(([name, reason]) => `${name} ${reason}`).join('; ');
+        simStatus.style.display = 'block';
+    }
+
+    function renderHuffmanTree(treeData, containerSelector) {
         const container = document.querySelector(containerSelector);
         container.innerHTML = '';
-        outputElement.innerText = binaryStr || 'Encoded bits will appear here...';
         if (!treeData) return;
 
         const width = container.offsetWidth || 600;
@@ -127,34 +273,17 @@ document.addEventListener('DOMContentLoaded', () => {
             .text(d => d.data.name || '');
     }
 
-    function renderLZWDict(dict, codes) {
-        lzwDictBody.innerHTML = '';
-        lzwCodesOutput.innerText = codes ? codes.join(', ') : 'Encoded codes will appear here...';
-        if (!dict) return;
-
-        // Sort by code (value) to show chronological order of addition
-        const items = Object.entries(dict).sort((a, b) => a[1] - b[1]);
-
-        items.forEach(([key, val]) => {
-            const row = document.createElement('tr');
-            
-            // Format key tuple (prefix, char)
-            const cleanKey = key.replace(/[()]/g, '').split(',').map(s => s.trim()).join(' + ');
-            
-            row.innerHTML = `
-                <td style="padding: 0.5rem; border-bottom: 1px solid rgba(255,255,255,0.05); color: #f1f5f9;">${cleanKey}</td>
-                <td style="padding: 0.5rem; border-bottom: 1px solid rgba(255,255,255,0.05); text-align: right; color: var(--accent);">${val}</td>
-            `;
-            lzwDictBody.appendChild(row);
-        });
-    }
-
     function resetUI() {
+        simulationId = null;
         lzwDictBody.innerHTML = '';
         lzwCodesOutput.innerText = 'Encoded codes will appear here...';
         treeContainer.innerHTML = '';
         huffmanBinaryOutput.innerText = 'Encoded bits will appear here...';
         hybridTreeContainer.innerHTML = '';
         hybridBinaryOutput.innerText = 'Encoded bits will appear here...';
+        huffmanSize.innerText = '';
+        lzwSize.innerText = '';
+        hybridSize.innerText = '';
+        renderStatus(null);
     }
 });
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, estimate_cost
+
+
+def test_estimates_grow_with_size():
+    small_mem, small_cpu = estimate_cost(1024, 'hybrid')
+    big_mem, big_cpu = estimate_cost(100 * 1024 * 1024, 'hybrid')
+    assert big_mem > small_mem and big_cpu > small_cpu
+
+
+def test_queue_then_reject_when_over_budget():
+    controller = AdmissionController(cpu_slots=1, max_queue=1, queue_timeout=5.0)
+    first = controller.admit(1024, 'lzma')
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.admit(1024, 'lzma')))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while controller.stats()['queue_depth'] == 0:
+        assert time.monotonic() < deadline, "waiter never queued"
+        time.sleep(0.001)
+
+    # Queue is full: the next request is turned away with a retry hint
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit(1024, 'lzma')
+    assert rejected.value.retry_after >= 1
+
+    first.release()
+    waiter.join()
+    assert len(admitted) == 1 and controller.stats()['running'] == 1
+    admitted[0].release()
+    assert controller.stats()['rejected'] == 1
+
+
+def test_wait_times_out():
+    controller = AdmissionController(cpu_slots=1, queue_timeout=0.05)
+    with controller.admit(10, 'decompress'):
+        with pytest.raises(AdmissionRejected):
+            controller.admit(10, 'decompress')
+
+
+def test_lzma_cost_follows_the_dictionary():
+    # Dictionaries are sized to the input, so small LZMA jobs are cheap
+    assert estimate_cost(10 * 1024, 'lzma')[0] < 4 * 1024 * 1024
+    one_mb, _ = estimate_cost(1024 * 1024, 'lzma')
+    assert 12 * 1024 * 1024 < one_mb < 20 * 1024 * 1024
+    assert estimate_cost(1024 * 1024, 'auto')[0] > one_mb
+
+
+def test_reprice_on_declared_size():
+    controller = AdmissionController(cpu_slots=2, memory_budget=estimate_cost(1 << 20, 'decompress')[0] * 2,
+                                     queue_timeout=0.05)
+    small = controller.admit(1024, 'decompress')
+    other = controller.admit(1024, 'decompress')
+
+    # Cheaper: same ticket, smaller charge
+    assert controller.reprice(small, 10, 'decompress') is small
+    assert controller.stats()['memory_in_use'] == small.memory + other.memory
+
+    # Dearer than the budget allows next to another job: released, then turned away
+    with pytest.raises(AdmissionRejected):
+        controller.reprice(small, 1 << 30, 'decompress')
+    assert controller.stats()['running'] == 1
+    other.release()
+    assert controller.stats()['memory_in_use'] == 0
@@ -0,0 +1,34 @@
+import analysis_pool
+import compress
+
+
+def test_parallel_matches_serial_and_reports_caps():
+    text = "abracadabra " * 400
+    try:
+        assert analysis_pool.simulate_all_parallel(text) == compress.simulate_all(text)
+
+        parts = [part for part, _ in analysis_pool.simulate_parallel(text, limits={'huffman': 100})]
+        assert parts[0] == "sizes" and parts[-1] == "status"
+        capped = analysis_pool.simulate_all_parallel(text, limits={'huffman': 100})
+        assert capped['partial'] == {'huffman': "input truncated to 100 bytes"}
+
+        # Sizes never mix an LZW prefix with full-input numbers
+        truncated = analysis_pool.simulate_all_parallel(text, limits={'lzw': 500})
+        assert truncated['lzw'] is None and truncated['huffman'] == compress.huffman_encoded_size(text.encode())
+
+        # A zero deadline never blocks: LZW (and so hybrid) come back as partial
+        rushed = analysis_pool.simulate_all_parallel(text * 200, timeout=0)
+        assert 'lzw' in rushed['partial'] and rushed['original'] == len(text) * 200
+    finally:
+        analysis_pool.shutdown()
+
+
+def test_pool_shut_down_mid_request_is_reported(monkeypatch):
+    pool = analysis_pool.get_pool()
+    analysis_pool.shutdown() # another thread won the race
+    monkeypatch.setattr(analysis_pool, 'get_pool', lambda: pool)
+
+    result = analysis_pool.simulate_all_parallel("abracadabra " * 40)
+    assert result['partial']['lzw'].startswith("failed:")
+    assert result['partial']['huffman'].startswith("failed:")
+    assert result['huffman'] == compress.huffman_encoded_size(("abracadabra " * 40).encode())
@@ -0,0 +1,70 @@
+import pytest
+
+import decompress
+from artifact_store import ArtifactStore
+
+
+def test_lru_eviction_respects_quota_and_pins(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=250, max_files=10)
+    for name in ("a.lzh", "b.lzh", "c.lzh"):
+        (tmp_path / name).write_bytes(b"x" * 100)
+        store.add(name)
+
+    # 'a' was downloaded recently, so 'b' is the least recently used
+    store.touch("a.lzh")
+    store.pin("b.lzh")
+    assert store.evict() == ["c.lzh"]
+    store.unpin("b.lzh")
+
+    assert not (tmp_path / "c.lzh").exists()
+    assert store.stats()['bytes'] == 200
+
+    # Index survives a restart (it is written on every change)
+    reopened = ArtifactStore(str(tmp_path), max_files=1)
+    assert reopened.evict() == ["b.lzh"]
+    assert "a.lzh" in reopened
+
+
+def test_delta_bases_outlive_their_dependents(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_files=1)
+    for name, base in (("v1.lzh", None), ("v2.lzh", "v1.lzh")):
+        (tmp_path / name).write_bytes(b"x" * 10)
+        store.add(name, base=base)
+
+    # v1 is older but v2 needs it: v2 goes first, then v1 is free to go
+    assert store.evict() == ["v2.lzh"]
+    store.max_files = 0
+    assert store.evict() == ["v1.lzh"]
+    store.max_files = 1
+
+    (tmp_path / "v1.lzh").write_bytes(b"x")
+    store.add("v1.lzh")
+    (tmp_path / "v2.lzh").write_bytes(b"x")
+    store.add("v2.lzh", base="v1.lzh")
+    assert store.in_use("v1.lzh") and store.base_of("v2.lzh") == "v1.lzh"
+    with pytest.raises(ValueError):
+        store.remove("v1.lzh")
+
+    # Dependencies survive a restart
+    reopened = ArtifactStore(str(tmp_path), max_files=1)
+    assert reopened.has_dependents("v1.lzh")
+    reopened.remove("v2.lzh")
+    reopened.remove("v1.lzh")
+    assert reopened.stats()['files'] == 0
+
+
+def test_restart_reconciles_index_with_directory(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    for name in ("kept.lzh", "gone.lzh"):
+        (tmp_path / name).write_bytes(b"x" * 10)
+        store.add(name)
+
+    # Written after the last save (e.g. a crash between write and add), or
+    # deleted behind the store's back
+    (tmp_path / "late.lzh").write_bytes(b"\x08\x08\x00kept.lzh")
+    (tmp_path / "gone.lzh").unlink()
+
+    reopened = ArtifactStore(str(tmp_path), base_reader=decompress.delta_reference)
+    assert "late.lzh" in reopened and "gone.lzh" not in reopened
+    assert reopened.base_of("late.lzh") == "kept.lzh"
+    assert reopened.stats()['files'] == 2
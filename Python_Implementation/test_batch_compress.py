@@ -0,0 +1,48 @@
+import os
+
+import batch_compress
+import decompress
+
+
+def test_batch_compress_incremental(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    (src / "logs").mkdir(parents=True)
+    (src / "a.txt").write_bytes(b"hello world " * 200)
+    (src / "logs" / "b.log").write_bytes(b"INFO ok\n" * 500)
+
+    first = batch_compress.batch_compress(str(src), str(out), workers=2, verbose=False)
+    assert first['compressed'] == 2
+
+    # Nothing changed: everything is skipped without recompressing
+    second = batch_compress.batch_compress(str(src), str(out), workers=2, verbose=False)
+    assert second['compressed'] == 0 and second['skipped'] == 2
+
+    # Touch without changing content: hash matches, still skipped
+    os.utime(src / "a.txt", ns=(1, 1))
+    third = batch_compress.batch_compress(str(src), str(out), workers=2, verbose=False)
+    assert third['compressed'] == 0 and third['skipped'] == 2
+
+    (src / "a.txt").write_bytes(b"changed content")
+    fourth = batch_compress.batch_compress(str(src), str(out), workers=2, verbose=False)
+    assert fourth['compressed'] == 1
+
+    restored = tmp_path / "a.restored"
+    decompress.decompress_file(str(out / "a.txt.lzh"), str(restored))
+    assert restored.read_bytes() == b"changed content"
+
+
+def test_batch_compress_empty_file(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    src.mkdir()
+    (src / "empty.txt").write_bytes(b"")
+
+    first = batch_compress.batch_compress(str(src), str(out), verbose=False)
+    assert first['compressed'] == 1
+    second = batch_compress.batch_compress(str(src), str(out), verbose=False)
+    assert second['compressed'] == 0 and second['skipped'] == 1
+
+    restored = tmp_path / "empty.restored"
+    decompress.decompress_file(str(out / "empty.txt.lzh"), str(restored))
+    assert restored.read_bytes() == b""
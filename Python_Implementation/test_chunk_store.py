@@ -0,0 +1,87 @@
+import io
+import random
+
+import pytest
+
+import chunk_store
+import compress
+import decompress
+from chunk_store import ChunkStore, chunk_boundaries, iter_chunks, iter_file_chunks, iter_inline_container
+
+
+def test_boundaries_resync_after_an_edit():
+    rng = random.Random(7)
+    data = rng.randbytes(1 << 20)
+    edited = data[:1000] + b"inserted" + data[1000:]
+
+    old = list(chunk_boundaries(data))
+    new = list(chunk_boundaries(edited))
+    assert old[-1] == len(data)
+    # Only the chunk containing the edit moves; later boundaries shift by 8
+    shifted = {end - 8 for end in new[1:]}
+    assert len(shifted & set(old)) >= len(old) - 2
+
+
+def test_streamed_chunks_match_whole_file():
+    rng = random.Random(5)
+    data = rng.randbytes(1 << 20) + b"\x00" * (600 * 1024) # random, then max-size cuts
+    for read_size in (100 * 1024, 1 << 20):
+        assert list(iter_file_chunks(io.BytesIO(data), read_size=read_size)) == list(iter_chunks(data))
+    assert list(iter_file_chunks(io.BytesIO(b""))) == []
+
+
+def test_dedup_round_trip_and_refcounts(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    rng = random.Random(3)
+    base = rng.randbytes(600 * 1024)
+    (tmp_path / "a.bin").write_bytes(base)
+    (tmp_path / "b.bin").write_bytes(base + b"tail")
+
+    for name in ("a.bin", "b.bin"):
+        compress.compress_file(str(tmp_path / name), str(tmp_path / (name + ".lzh")),
+                               with_tree=False, codec='dedup', chunk_store=store)
+    stats = store.stats()
+    assert stats['manifests'] == 2 and stats['dedup_hits'] > 0
+
+    decompress.decompress_file(str(tmp_path / "b.bin.lzh"), str(tmp_path / "b.out"), chunk_store=store)
+    assert (tmp_path / "b.out").read_bytes() == base + b"tail"
+
+    # The downloadable form (flag 7) decodes without the store
+    manifest = (tmp_path / "b.bin.lzh").read_bytes()[1:]
+    (tmp_path / "b.inline").write_bytes(b"".join(iter_inline_container(manifest, store)))
+    decompress.decompress_file(str(tmp_path / "b.inline"), str(tmp_path / "b.out2"))
+    assert (tmp_path / "b.out2").read_bytes() == base + b"tail"
+
+    # Shared chunks survive until the last manifest is released
+    store.release("a.bin.lzh")
+    decompress.decompress_file(str(tmp_path / "b.bin.lzh"), str(tmp_path / "b.out"), chunk_store=store)
+    store.release("b.bin.lzh")
+    assert store.stats()['chunks'] == 0 and store.stats()['stored_bytes'] == 0
+    assert ChunkStore(str(tmp_path / "chunks")).stats()['chunks'] == 0
+
+
+def test_failed_put_releases_its_reservation(tmp_path, monkeypatch):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    chunk = b"payload " * 1000
+
+    def broken(_):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(chunk_store, 'pack_blob', broken)
+    with pytest.raises(OSError):
+        store.put(chunk)
+    assert store.stats()['chunks'] == 0
+
+    monkeypatch.undo()
+    digest = store.put(chunk)
+    assert store.get(digest) == chunk
+
+
+def test_corrupt_chunk_is_rejected(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"))
+    digest = store.put(b"payload " * 1000)
+    other = chunk_store.pack_blob(b"tampered " * 1000)
+    with open(store._chunk_path(digest), 'wb') as f:
+        f.write(other)
+    with pytest.raises(ValueError):
+        store.get(digest)
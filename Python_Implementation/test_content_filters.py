@@ -0,0 +1,39 @@
+import lzma
+import struct
+
+import compress
+import content_filters
+import decompress
+
+
+def wav(frames):
+    fmt = struct.pack('<HHLLHH', 1, 2, 8000, 32000, 4, 16)
+    return (b'RIFF' + struct.pack('<L', 36 + len(frames)) + b'WAVE'
+            + b'fmt ' + struct.pack('<L', len(fmt)) + fmt
+            + b'data' + struct.pack('<L', len(frames)) + frames)
+
+
+def test_classification():
+    elf = b'\x7fELF\x02\x01\x01' + bytes(11) + struct.pack('<H', 62) + bytes(100)
+    records = b''.join(struct.pack('<LHHd', i, i % 7, 3, i / 4) for i in range(2000))
+
+    assert content_filters.classify(b"2025-01-01 INFO started\n" * 100) == ('text', None)
+    assert content_filters.classify(elf) == ('executable', lzma.FILTER_X86)
+    assert content_filters.classify(wav(bytes(4000))) == ('media', 4)
+    assert content_filters.classify(b'PK\x03\x04' + bytes(100)) == ('compressed', None)
+    assert content_filters.classify(records) == ('structured', 16)
+
+
+def test_filtered_xz_round_trip_and_declared_size(tmp_path):
+    data = wav(b''.join(struct.pack('<hh', i % 300, -i % 200) for i in range(20000)))
+    _, filters = content_filters.choose_filters(data, len(data))
+    assert [f['id'] for f in filters] == [lzma.FILTER_DELTA, lzma.FILTER_LZMA2]
+
+    # A plain .xz stream: the chain travels in its block headers
+    payload = compress.lzma_filtered_compress(data)
+    assert lzma.decompress(payload) == data
+
+    (tmp_path / "media.lzh").write_bytes(b'\x09' + payload)
+    assert decompress.declared_output_size(str(tmp_path / "media.lzh")) == len(data)
+    decompress.decompress_file(str(tmp_path / "media.lzh"), str(tmp_path / "media.wav"))
+    assert (tmp_path / "media.wav").read_bytes() == data
@@ -0,0 +1,55 @@
+import lzma
+import random
+
+import pytest
+
+import compress
+import decompress
+from generate_log import mutate
+
+
+def test_delta_round_trip_is_small_for_revisions(tmp_path):
+    rng = random.Random(5)
+    reference = b"".join(b"line %d: %s\n" % (i, rng.choice([b"ok", b"retry", b"fail"]))
+                         for i in range(20000))
+    target = mutate(rng, reference, 0.001)
+
+    (tmp_path / "v2.txt").write_bytes(target)
+    compress.compress_file(str(tmp_path / "v2.txt"), str(tmp_path / "v2.lzh"), with_tree=False,
+                           codec='delta', reference=reference, reference_name="v1.txt")
+    packed = (tmp_path / "v2.lzh").read_bytes()
+    assert packed[0] == 8
+    assert len(packed) * 10 < len(lzma.compress(target))
+
+    requested = []
+    def resolve(name):
+        requested.append(name)
+        return reference
+    decompress.decompress_file(str(tmp_path / "v2.lzh"), str(tmp_path / "v2.out"),
+                               reference_resolver=resolve)
+    assert (tmp_path / "v2.out").read_bytes() == target
+    assert requested == ["v1.txt"]
+
+
+def test_delta_rejects_wrong_reference():
+    reference = bytes(range(256)) * 64
+    payload = compress.delta_compress_bytes(reference, reference[100:] + b"new", "base")
+    assert decompress.delta_decompress_bytes(payload, lambda name: reference) == reference[100:] + b"new"
+    with pytest.raises(ValueError):
+        decompress.delta_decompress_bytes(payload, lambda name: reference[:-1])
+
+
+def test_delta_finds_the_reference_after_new_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(compress, 'DELTA_MAX_LITERAL_RUN', 4096)
+    rng = random.Random(9)
+    reference = b"".join(b"row %d %d\n" % (i, rng.randrange(1000)) for i in range(20000))
+    new = rng.randbytes(50000)
+    payload = compress.delta_compress_bytes(reference, new + reference, "v1.txt")
+    assert len(payload) < len(new) + 2000
+    assert decompress.delta_decompress_bytes(payload, lambda name: reference) == new + reference
+
+    # Downloaded next to a compressed base, the CLI resolver decodes the base first
+    (tmp_path / "v1.txt").write_bytes(reference)
+    compress.compress_file(str(tmp_path / "v1.txt"), str(tmp_path / "v1.txt.lzh"), with_tree=False)
+    resolve = decompress.directory_resolver(str(tmp_path))
+    assert resolve("v1.txt.lzh") == reference
@@ -0,0 +1,36 @@
+import lzma
+
+import generate_log
+
+
+def test_profiles_are_deterministic_and_exact_size(tmp_path):
+    for profile in generate_log.PROFILES:
+        a, b = tmp_path / f"{profile}_a", tmp_path / f"{profile}_b"
+        generate_log.generate(profile, str(a), 300000, seed=5)
+        generate_log.generate(profile, str(b), 300000, seed=5)
+        assert a.stat().st_size == 300000
+        assert a.read_bytes() == b.read_bytes()
+
+    other = tmp_path / "other"
+    generate_log.generate('logs', str(other), 300000, seed=6)
+    assert other.read_bytes() != (tmp_path / "logs_a").read_bytes()
+
+
+def test_near_duplicates_share_most_content(tmp_path):
+    paths = generate_log.generate_near_duplicates(str(tmp_path / "set"), 3, 100000, seed=1)
+    versions = [open(p, 'rb').read() for p in paths]
+    assert len(versions) == 3
+    assert versions[0] != versions[1] != versions[2]
+    # Light edits: a version costs little extra once its predecessor is known
+    separate = len(lzma.compress(versions[0])) + len(lzma.compress(versions[1]))
+    assert len(lzma.compress(versions[0] + versions[1])) < 0.6 * separate
+    assert generate_log.parse_size("10MB") == 10 * 1024 * 1024
+
+
+def test_near_duplicates_stream_block_by_block(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_log, 'BLOCK_SIZE', 4096)
+    paths = generate_log.generate_near_duplicates(str(tmp_path / "set"), 3, 100000, seed=2)
+    versions = [open(p, 'rb').read() for p in paths]
+    assert abs(len(versions[2]) - 100000) < 5000
+    separate = len(lzma.compress(versions[1])) + len(lzma.compress(versions[2]))
+    assert len(lzma.compress(versions[1] + versions[2])) < 0.6 * separate
@@ -0,0 +1,76 @@
+import io
+import random
+from collections import Counter
+
+import compress
+import decompress
+import huffman_core
+
+
+def test_huffman_round_trip():
+    random.seed(7)
+    for data in (b"TOBEORNOTTOBEORTOBEORNOT", b"aaaa", bytes(random.randrange(256) for _ in range(5000))):
+        output, tree_json, _ = compress.huffman_compress_bytes_with_tree(data)
+        assert tree_json["value"] == len(data)
+        assert decompress.huffman_decompress_bytes(io.BytesIO(bytes(output))) == data
+
+
+def test_streaming_huffman_matches_in_memory_encoder(tmp_path):
+    random.seed(11)
+    skewed = bytes(random.choice(b"aaaabbc\n") for _ in range(70000))
+    for data in (b"zzzz", skewed):
+        path = tmp_path / "in.bin"
+        path.write_bytes(data)
+        out = io.BytesIO()
+        with open(path, 'rb') as f:
+            # Tiny chunks so codes and leftover bits straddle chunk boundaries
+            written = compress.huffman_compress_stream(f, out, chunk_size=1001)
+
+        expected, _, _ = compress.huffman_compress_bytes_with_tree(data)
+        assert out.getvalue() == bytes(expected) and written == len(expected)
+        assert decompress.huffman_decompress_bytes(io.BytesIO(out.getvalue())) == data
+
+    compress.compress_file(str(path), str(tmp_path / "in.lzh"), with_tree=False, codec='huffman')
+    assert (tmp_path / "in.lzh").read_bytes()[0] == 0
+    decompress.decompress_file(str(tmp_path / "in.lzh"), str(tmp_path / "out.bin"))
+    assert (tmp_path / "out.bin").read_bytes() == skewed
+
+
+def test_code_lengths_are_optimal_prefix_codes():
+    frequency = Counter(b"abracadabra alakazam")
+    lengths = huffman_core.code_lengths(frequency)
+    # Kraft equality holds for a full binary tree
+    assert sum(2.0 ** -length for length in lengths.values()) == 1.0
+
+    # Same total cost as the heap-built tree
+    _, heap_lengths = huffman_core.code_table(huffman_core.build_tree(frequency))
+    assert (sum(frequency[s] * lengths[s] for s in frequency)
+            == sum(frequency[s] * heap_lengths[s] for s in frequency))
+
+    codes = huffman_core.canonical_codes(lengths)
+    words = sorted(format(code, f'0{length}b') for code, length in codes.values())
+    assert all(not b.startswith(a) for a, b in zip(words, words[1:]))
+
+
+def test_hybrid_codec_round_trip(tmp_path):
+    data = b"GET /api/v1/resource HTTP/1.1 200\n" * 300 + bytes(range(256))
+    payload = compress.hybrid_compress_bytes(data)
+    assert decompress.hybrid_decompress_bytes(payload) == data
+
+    src = tmp_path / "in.log"
+    src.write_bytes(data)
+    compress.compress_file(str(src), str(tmp_path / "out.lzh"), with_tree=False, codec='hybrid')
+    assert (tmp_path / "out.lzh").read_bytes()[:1] == b'\x04'
+    decompress.decompress_file(str(tmp_path / "out.lzh"), str(tmp_path / "out.log"))
+    assert (tmp_path / "out.log").read_bytes() == data
+
+
+def test_simulate_stream_sends_sizes_first():
+    parts = list(compress.simulate_stream("abracadabra " * 50))
+    assert [name for name, _ in parts] == ["sizes", "huffman", "lzw", "hybrid"]
+
+    merged = {}
+    for _, payload in parts:
+        merged.update(payload)
+    assert merged == compress.simulate_all("abracadabra " * 50)
+    assert parts[0][1]["huffman"] == len(compress.huffman_compress_bytes_with_tree(b"abracadabra " * 50)[0])
@@ -1,4 +1,6 @@
-from compress import lzw_compress
+from compress import lzw_compress, lzw_encode, lzw_pack_varwidth, RatioResetPolicy
+from decompress import lzw_decompress, lzw_decode
+import random
 import struct
 
 def test_lzw():
@@ -15,5 +17,33 @@ def test_lzw():
     # Expected LZW behavior check
     # TOBEORNOT... should compress well.
     
+def test_lzw_variable_width():
+    random.seed(11)
+    # Random bytes fill the 16-bit dictionary, exercising CLEAR_CODE resets
+    for data in (b"TOBEORNOTTOBEORTOBEORNOT", bytes(random.randrange(256) for _ in range(200000))):
+        packed = lzw_compress(data, variable_width=True)
+        assert lzw_decompress(packed, variable_width=True) == data
+        assert len(packed) < len(lzw_compress(data))
+
+def test_lzw_adaptive_reset_on_content_shift():
+    # Two halves with unrelated vocabularies: the first half's phrases go stale
+    rng = random.Random(4)
+    halves = []
+    for _ in range(2):
+        words = [bytes(rng.choice(b"abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+                 for _ in range(20)]
+        halves.append(b" ".join(rng.choice(words) for _ in range(40000)))
+    data = b"\n".join(halves)
+
+    policy = RatioResetPolicy()
+    adaptive, _ = lzw_encode(data, policy)
+    baseline, _ = lzw_encode(data)
+
+    assert lzw_decode(adaptive) == data
+    assert policy.stats()['resets'] >= 1
+    assert len(lzw_pack_varwidth(adaptive)) < len(lzw_pack_varwidth(baseline))
+
 if __name__ == "__main__":
     test_lzw()
+    test_lzw_variable_width()
+    test_lzw_adaptive_reset_on_content_shift()
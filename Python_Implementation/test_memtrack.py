@@ -0,0 +1,92 @@
+import lzma
+import threading
+
+import compress
+import decompress
+import memtrack
+
+
+def test_peak_tracker_reports_allocations():
+    with memtrack.PeakTracker('test', enabled=True) as tracker:
+        block = bytearray(4 * 1024 * 1024)
+        del block
+    assert tracker.peak_bytes >= 4 * 1024 * 1024
+    assert memtrack.metrics.snapshot()['test']['max_peak'] >= 4 * 1024 * 1024
+
+    with memtrack.PeakTracker('test', enabled=False) as tracker:
+        pass
+    assert tracker.peak_bytes is None
+
+
+def test_overlapping_job_keeps_its_peak():
+    allocated = threading.Event()
+    second_entered = threading.Event()
+    trackers = []
+
+    def job():
+        with memtrack.PeakTracker('test', enabled=True) as tracker:
+            block = bytearray(16 * 1024 * 1024)
+            del block
+            allocated.set()
+            second_entered.wait(5)
+        trackers.append(tracker)
+
+    worker = threading.Thread(target=job)
+    worker.start()
+    allocated.wait(5)
+    with memtrack.PeakTracker('test', enabled=True):
+        second_entered.set()
+        worker.join()
+    assert trackers[0].peak_bytes >= 16 * 1024 * 1024
+
+
+def test_low_memory_paths_round_trip(tmp_path, monkeypatch):
+    data = b"2026-01-01 INFO request served in 12ms\n" * 60000
+    src = tmp_path / "in.log"
+    src.write_bytes(data)
+
+    # Any job is over a 1-byte budget, so both codecs take the chunked paths
+    monkeypatch.setattr(memtrack, 'memory_budget', 1)
+    monkeypatch.setattr(compress, 'LOW_MEMORY_CHUNK', 64 * 1024)
+    monkeypatch.setattr(decompress, 'LOW_MEMORY_CHUNK', 64 * 1024)
+
+    tree = compress.compress_file(str(src), str(tmp_path / "out.lzh"))
+    assert tree is not None
+    assert (tmp_path / "out.lzh").read_bytes()[:1] == b'\x09'
+
+    decompress.decompress_file(str(tmp_path / "out.lzh"), str(tmp_path / "out.log"))
+    assert (tmp_path / "out.log").read_bytes() == data
+
+
+def test_decompression_priced_on_declared_size(tmp_path, monkeypatch):
+    data = b"2026-01-01 INFO request served in 12ms\n" * 60000
+    src = tmp_path / "in.log"
+    src.write_bytes(data)
+    for name, flag in (("xz.lzh", b'\x03'), ("id.lzh", b'\x02')):
+        payload = lzma.compress(data) if flag == b'\x03' else data
+        (tmp_path / name).write_bytes(flag + payload)
+        assert decompress.declared_output_size(str(tmp_path / name)) == len(data)
+
+    compress.compress_file(str(src), str(tmp_path / "huff.lzh"), codec='huffman', with_tree=False)
+    assert decompress.declared_output_size(str(tmp_path / "huff.lzh")) == len(data)
+
+    # The compressed file is far under the budget, its output is not
+    xz_size = (tmp_path / "xz.lzh").stat().st_size
+    budget, _ = memtrack.estimate_cost(xz_size * 4, 'decompress')
+    monkeypatch.setattr(memtrack, 'memory_budget', budget)
+    assert decompress.needs_low_memory(str(tmp_path / "xz.lzh"))
+
+    # Low-memory compression reports the codec it actually wrote
+    monkeypatch.setattr(memtrack, 'memory_budget', 1)
+    compress.compress_file(str(src), str(tmp_path / "out.lzh"), codec='hybrid', with_tree=False)
+    assert compress.written_codec(str(tmp_path / "out.lzh")) == 'lzma'
+
+
+def test_truncated_header_has_no_declared_size(tmp_path, monkeypatch):
+    for name, blob in (("short.lzh", b'\x08\x01'), ("cut.lzh", b'\x08\x01\x00a' + b'\x00' * 32 + b'\x01')):
+        (tmp_path / name).write_bytes(blob)
+        assert decompress.declared_output_size(str(tmp_path / name)) is None
+
+    # Unknown output size counts as over any budget instead of raising
+    monkeypatch.setattr(memtrack, 'memory_budget', 1 << 30)
+    assert decompress.needs_low_memory(str(tmp_path / "short.lzh"))
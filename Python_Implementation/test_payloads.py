@@ -0,0 +1,36 @@
+import io
+
+import pytest
+
+import payloads
+import compress
+import decompress
+
+
+PAYLOADS = [b"", b"a", b"aaaa", b"GET /api/users 200\n" * 20, bytes(range(256)) * 3]
+
+
+def test_fast_huffman_matches_module_encoder():
+    for data in PAYLOADS:
+        packed = compress.huffman_compress_bytes(data)
+        expected, _, _ = compress.huffman_compress_bytes_with_tree(data) if data else (b'\x00' * 5, None, None)
+        assert packed == bytes(expected)
+        assert decompress.huffman_decompress_bytes(io.BytesIO(packed)) == data
+
+
+def test_payload_round_trip_and_identity_fallback():
+    for codec, flag in (('lzw', 5), ('huffman', 0)):
+        for data in PAYLOADS:
+            blob = payloads.compress_payload(data, codec)
+            assert blob[0] in (flag, 2)
+            assert payloads.decompress_payload(blob) == data
+    assert payloads.compress_payload(b"x", 'lzw') == b'\x02x'
+
+
+def test_decompress_payload_output_cap():
+    bomb = b'\x00' + (1 << 30).to_bytes(4, 'little') + b'\x01' + b'a' + (1 << 30).to_bytes(4, 'little')
+    runs = payloads.compress_payload(b"a" * 100000, 'lzw')
+    for blob in (bomb, runs):
+        with pytest.raises(ValueError):
+            payloads.decompress_payload(blob, max_output=65536)
+    assert payloads.decompress_payload(runs, max_output=100000) == b"a" * 100000
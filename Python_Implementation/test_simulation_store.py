@@ -0,0 +1,36 @@
+import struct
+
+import compress
+from simulation_store import SimulationStore, pack_bits, slice_bits
+
+
+def test_slice_bits_matches_string_slicing():
+    bits = "1011001110001111010110"
+    packed, nbits = pack_bits(bits)
+    for offset in range(len(bits)):
+        for limit in (1, 3, 8, 13, 100):
+            window, count = slice_bits(packed, nbits, offset, limit)
+            expected = bits[offset:offset + limit]
+            assert count == len(expected)
+            assert format(int.from_bytes(window, 'big') >> (len(window) * 8 - count), f'0{count}b') == expected
+
+
+def test_store_pages_packed_artifacts():
+    store = SimulationStore()
+    sim_id = store.create()
+    text = "TOBEORNOTTOBEORTOBEORNOT" * 20
+    full = compress.simulate_all(text)
+
+    for _, payload in compress.simulate_stream(text, raw_dict=True):
+        compact = store.compact_part(sim_id, payload)
+        assert not any(isinstance(v, str) and len(v) > 64 for v in compact.values())
+
+    payload, total, count = store.read(sim_id, 'lzw_codes', offset=5, limit=10)
+    assert total == len(full['lzw_codes']) and count == 10
+    assert list(struct.unpack('<10H', payload)) == full['lzw_codes'][5:15]
+
+    payload, total, count = store.read(sim_id, 'lzw_dict', offset=0, limit=1)
+    code, prefix, byte_val = struct.unpack('<HHB', payload)
+    assert full['lzw_dict'][str((prefix, byte_val))] == code == 257
+
+    assert store.read('missing', 'lzw_codes') is None